@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of text and bytes input of ``CliHandler``.
+
+Synthetic access log is written to temporary file, and only lines of
+status 500, one percent of them, are parsed by :func:`clitool.accesslog.parse`.
+Text path decodes every line before filter. Bytes path gives lines of bytes
+to procedure marked by :func:`clitool.processor.bytes_aware`, and decodes
+only lines kept by filter. Give large ``--count`` for multi-GB input, about
+180 bytes for each line. Saving grows with cost of decoding, such as
+``--multibyte`` text in legacy ``--input-encoding``. Mmap path gives
+:class:`memoryview` of mapped file searched by regular expression. ::
+
+    $ python benchmarks/lines.py --count 20000000
+    $ python benchmarks/lines.py --multibyte --input-encoding cp932
+"""
+
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import six
+from six import print_
+
+from clitool.accesslog import parse
+from clitool.cli import parse_arguments
+from clitool.processor import CliHandler, Streamer
+from clitool.textio import MappedLines, byte_lines, decode
+
+from streamer import accesslog
+
+
+def errors_text(line):
+    if '" 500 ' not in line:
+        return
+    return parse(line)
+
+
+class ErrorsBytes(object):
+    bytes_aware = True
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+    def __call__(self, line):
+        # "find" is faster than "in" operator on bytes.
+        if line.find(b'" 500 ') < 0:
+            return
+        return parse(decode(line, self.encoding))
+
+
+class ErrorsView(ErrorsBytes):
+    pattern = re.compile(br'" 500 ')
+
+    def __call__(self, line):
+        if self.pattern.search(line) is None:
+            return
+        return parse(decode(line, self.encoding))
+
+
+def write_log(name, count, encoding, multibyte):
+    with io.open(name, 'w', encoding=encoding) as fp:
+        for i, line in enumerate(accesslog(count)):
+            if i % 100 == 0:
+                line = line.replace('" 200 ', '" 500 ')
+            if multibyte:
+                line = line.replace(
+                    'Mozilla', six.u('\u30d6\u30e9\u30a6\u30b6'))
+            fp.write(line + six.u('\n'))
+
+
+def report(label, count, size, elapsed):
+    print_("%-32s %10d items %8.3f sec %12.1f items/sec %8.1f MB/sec" % (
+        label, count, elapsed, count / elapsed, size / elapsed / 1e6))
+
+
+def bench_read(label, name, count, encoding, read):
+    size = os.path.getsize(name)
+    start = time.time()
+    n = read(name, encoding)
+    report(label, n, size, time.time() - start)
+    assert n == count
+
+
+def read_text(name, encoding):
+    with io.open(name, encoding=encoding) as fp:
+        return sum(1 for _ in fp)
+
+
+def read_binary(name, encoding):
+    with open(name, 'rb') as fp:
+        return sum(1 for _ in fp)
+
+
+def read_byte_lines(name, encoding):
+    with byte_lines(io.open(name, 'rb', 0)) as fp:
+        return sum(1 for _ in fp)
+
+
+def read_mmap(name, encoding, view=False):
+    with open(name, 'rb') as fp:
+        lines = MappedLines(fp, view=view)
+        n = sum(1 for _ in lines)
+        lines.close()
+        return n
+
+
+def read_mmap_views(name, encoding):
+    return read_mmap(name, encoding, True)
+
+
+def bench_handler(label, name, count, encoding, procedure, mmap=False):
+    size = os.path.getsize(name)
+    results = []
+    s = Streamer(results.append, procedure, reporting_seconds=0)
+    start = time.time()
+    stats = CliHandler(s, mmap=mmap).handle(
+        [io.open(name, encoding=encoding)], encoding)
+    report(label, stats[0]['total'], size, time.time() - start)
+    assert len(results) == count // 100
+
+
+def main():
+    args = parse_arguments(count=dict(flags='--count', type=int,
+                                      default=1000000),
+                           multibyte=dict(flags='--multibyte',
+                                          action='store_true'))
+    encoding = args.input_encoding
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        write_log(name, args.count, encoding, args.multibyte)
+        for label, read in (('read text', read_text),
+                            ('read binary', read_binary),
+                            ('read byte_lines', read_byte_lines),
+                            ('read mmap', read_mmap),
+                            ('read mmap views', read_mmap_views)):
+            bench_read(label, name, args.count, encoding, read)
+        bench_handler('filter text', name, args.count, encoding,
+                      errors_text)
+        bench_handler('filter bytes', name, args.count, encoding,
+                      ErrorsBytes(encoding))
+        bench_handler('filter bytes, regex', name, args.count, encoding,
+                      ErrorsView(encoding))
+        bench_handler('filter mmap, regex', name, args.count, encoding,
+                      ErrorsView(encoding), mmap=True)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
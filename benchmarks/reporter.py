@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of ``SimpleDictReporter`` on parsed access log records.
+
+Records parsed by :func:`clitool.accesslog.parse` are given to the reporter
+counting ``"key:value"`` strings in one ``Counter``, as previous release
+did, and to the current reporter counting values of each field. ::
+
+    $ python benchmarks/reporter.py --count 10000000
+"""
+
+import itertools
+import time
+from collections import Counter
+
+from six import print_
+
+from clitool.accesslog import parse
+from clitool.cli import parse_arguments
+from clitool.processor import SimpleDictReporter
+
+from streamer import accesslog
+
+
+class FlatReporter(object):
+    """ Reporter of previous release.
+    """
+
+    def __init__(self):
+        self.counter = Counter()
+
+    def __call__(self, entry):
+        if type(entry) is not dict:
+            return
+        for k in entry:
+            v = entry[k]
+            if type(v) == str:
+                self.counter[k + ":" + v] += 1
+
+
+def bench(label, reporter, records, count):
+    start = time.time()
+    for entry in itertools.islice(itertools.cycle(records), count):
+        reporter(entry)
+    elapsed = time.time() - start
+    print_("%-32s %10d items %8.3f sec %12.1f items/sec" % (
+        label, count, elapsed, count / elapsed))
+
+
+def main():
+    args = parse_arguments(count=dict(flags='--count', type=int,
+                                      default=1000000))
+    records = [parse(line) for line in accesslog(100000)]
+    bench('flat "key:value"', FlatReporter(), records, args.count)
+    bench('per field', SimpleDictReporter(), records, args.count)
+    bench('per field, 3 fields', SimpleDictReporter(
+        fields=('method', 'status', 'host'), types=(str, int)),
+        records, args.count)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of parallel execution modes of ``Streamer``.
+
+Synthetic access log lines are parsed by :func:`clitool.accesslog.parse`
+on each mode, and throughput is printed. ::
+
+    $ python benchmarks/streamer.py --processes 4 --count 1000000
+"""
+
+import time
+
+from six import print_
+
+from clitool.accesslog import parse
+from clitool.cli import parse_arguments
+from clitool.processor import Streamer
+
+LINE = ('127.0.0.%d - - [22/Aug/2011:10:02:03 +0900] '
+        '"GET /path/%d?q=%d HTTP/1.1" 200 151 "-" '
+        '"Mozilla/5.0 (Windows NT 5.1; rv:6.0) Gecko/20100101 Firefox/6.0"')
+
+
+def accesslog(count):
+    for i in range(count):
+        yield LINE % (i % 256, i % 1000, i)
+
+
+def bench(label, count, chunksize, **kwargs):
+    s = Streamer(None, parse, **kwargs)
+    with s:
+        start = time.time()
+        stats = s.consume(accesslog(count), chunksize=chunksize)
+        elapsed = time.time() - start
+    print_("%-32s %10d items %8.3f sec %12.1f items/sec" % (
+        label, stats['success'], elapsed, count / elapsed))
+
+
+def main():
+    args = parse_arguments(count=dict(flags='--count', type=int,
+                                      default=200000))
+    processes = args.processes or 2
+    bench('unordered', args.count, args.chunksize, processes=processes)
+    bench('ordered', args.count, args.chunksize, processes=processes,
+          ordered=True)
+    for window in (1000, 10000, 100000):
+        bench('ordered window=%d' % (window, ), args.count, args.chunksize,
+              processes=processes, ordered=True, window=window)
+
+
+if __name__ == '__main__':
+    main()
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
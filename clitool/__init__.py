@@ -14,7 +14,7 @@ Command Line Tool Utilities
 Requirements
 ============
 
-* Python 2.7 or 3.x
+* Python 2.7 or 3.x (``clitool.aio`` requires Python 3.5 or later)
 
 Python 2.4, 2.5, 2.6 are not supported.
 
@@ -44,7 +44,16 @@ This file can parse basic command line options and arguments.
     usage: your-script.py [-h] [-c FILE] [-o FILE] [--basedir BASEDIR]
                           [--input-encoding INPUT_ENCODING]
                           [--output-encoding OUTPUT_ENCODING]
-                          [--processes PROCESSES] [--chunksize CHUNKSIZE]
+                          [--output-format {csv,tsv,jsonl,ltsv}]
+                          [--processes PROCESSES]
+                          [--executor {process,thread,serial}]
+                          [--partition {file,range}]
+                          [--chunksize CHUNKSIZE]
+                          [--checkpoint FILE] [--resume]
+                          [--dead-letter FILE]
+                          [--dead-letter-rate DEAD_LETTER_RATE]
+                          [--sample RATE] [--limit N] [--prefetch]
+                          [--mmap] [--follow] [--follow-offset FILE]
                           [-v | -q]
                           [FILE [FILE ...]]
 
@@ -62,10 +71,27 @@ This file can parse basic command line options and arguments.
                             encoding of input source
       --output-encoding OUTPUT_ENCODING
                             encoding of output distination
+      --output-format {csv,tsv,jsonl,ltsv}
+                            format of output records
       --processes PROCESSES
                             count of processes
+      --executor {process,thread,serial}
+                            kind of executor to run procedures
+      --partition {file,range}
+                            unit of work distributed to workers
       --chunksize CHUNKSIZE
                             a number of chunks submitted to the process pool
+      --checkpoint FILE     file to record processed position periodically
+      --resume              resume from checkpoint
+      --dead-letter FILE    file to write skipped and errored items
+      --dead-letter-rate DEAD_LETTER_RATE
+                            maximum count of dead letters in one second
+      --sample RATE         process items sampled at given rate
+      --limit N             process first N items of each file
+      --prefetch            decompress input files on another thread
+      --mmap                map plain input files to memory
+      --follow              follow lines appended to input file
+      --follow-offset FILE  file to save offset on follow mode
       -v, --verbose         set logging to verbose mode
       -q, --quiet           set logging to quiet mode
 
@@ -95,11 +121,25 @@ RUNNING_MODE_ENVKEY = 'PYTHON_CLITOOL_ENV'
 DEFAULT_ENCODING = 'utf-8'
 DEFAULT_RUNNING_MODE = 'development'
 
+EXECUTORS = ('process', 'thread', 'serial')
+PARTITIONS = ('file', 'range')
+OUTPUT_FORMATS = ('csv', 'tsv', 'jsonl', 'ltsv')
+
 PROCESSING_REPORTING_INTERVAL = 10000
+PROCESSING_REPORTING_SECONDS = 5.0
+PROCESSING_CHECKPOINT_SECONDS = 5.0
 PROCESSING_SUCCESS = 'success'
 PROCESSING_SKIPPED = 'skipped'
 PROCESSING_ERROR = 'error'
 PROCESSING_TOTAL = 'total'
 PROCESSING_TIME = 'time'
+PROCESSING_CHUNKSIZE = 'chunksize'
+PROCESSING_INFLIGHT = 'inflight'
+PROCESSING_INFLIGHT_BYTES = 'inflight_bytes'
+PROCESSING_PROCEDURES = 'procedures'
+PROCESSING_SAMPLING = 'sampling'
+
+FOLLOW_MIN_INTERVAL = 0.05
+FOLLOW_MAX_INTERVAL = 1.0
 
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -11,7 +11,17 @@ This module is also executable to parse access log record.
 
 .. code-block:: bash
 
-    $ tail -f /var/log/httpd/access_log | python -m clitool.accesslog
+    $ python -m clitool.accesslog --follow /var/log/httpd/access_log
+
+``--follow`` reads rotated log without loss, and ``--follow-offset FILE``
+resumes from saved offset after restart. ``--output-format`` writes
+records of :const:`FIELDS` as CSV, TSV, JSON Lines or LTSV instead of
+key/value lines.
+
+.. code-block:: bash
+
+    $ python -m clitool.accesslog --output-format ltsv -o access.ltsv \
+        /var/log/httpd/access_log
 
 Ouput labels come from <http://ltsv.org/>
 """
@@ -52,6 +62,23 @@ LOG_FORMAT = re.compile(r"""^
     (?P<trailing>.*)
 $""", re.VERBOSE)
 
+# Field definitions of parsed record for :mod:`clitool.sink`
+FIELDS = (
+    {'id': 'host', 'type': 'string'},
+    {'id': 'ident', 'type': 'string'},
+    {'id': 'user', 'type': 'string'},
+    {'id': 'time', 'type': 'datetime', 'format': '%Y-%m-%dT%H:%M:%S'},
+    {'id': 'method', 'type': 'string'},
+    {'id': 'path', 'type': 'string'},
+    {'id': 'query', 'type': 'string'},
+    {'id': 'protocol', 'type': 'string'},
+    {'id': 'status', 'type': 'integer'},
+    {'id': 'size', 'type': 'integer'},
+    {'id': 'referer', 'type': 'string'},
+    {'id': 'ua', 'type': 'string'},
+    {'id': 'trailing', 'type': 'string'}
+)
+
 Access = namedtuple('Access',
     '''host ident user day month year hour minute second timezone
     method path query protocol status size referer ua trailing''')
@@ -185,8 +212,10 @@ def logparse(*args, **kwargs):
 
 
 if __name__ == '__main__':
+    import sys
     from six import print_
     from clitool.cli import parse_arguments, clistream
+    from clitool.sink import open_sink
 
     RED = '\033[91m'
     PURPLE = '\033[95m'
@@ -196,7 +225,7 @@ if __name__ == '__main__':
                 color=dict(flags="--color", action="store_true"),
                 status=dict(flags="--status"))
 
-    lst = map(int, args.status.split(',')) if args.status else None
+    lst = [int(s) for s in args.status.split(',')] if args.status else None
 
     def p(e):
         if lst and not e['status'] in lst:
@@ -216,7 +245,19 @@ if __name__ == '__main__':
             print_(END, end='')
         print_("-" * 40)
 
-    stats = clistream(p, parse, files=args.files)
-    print_(stats)
+    if args.output_format:
+        with open_sink(args.output_format, args.output, FIELDS,
+                       args.output_encoding) as sink:
+
+            def w(e):
+                if lst and not e['status'] in lst:
+                    return
+                sink(e)
+
+            stats = clistream(w, parse, **vars(args))
+        print_(stats, file=sys.stderr)
+    else:
+        stats = clistream(p, parse, **vars(args))
+        print_(stats)
 
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
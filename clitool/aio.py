@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Stream processing utility on ``asyncio``.
+
+:class:`AsyncStreamer` accepts coroutine functions as procedures, and
+processes many items concurrently on one event loop. This is suitable for
+I/O bound procedures such as DNS lookup or HTTP enrichment. ::
+
+    async def resolve(entry):
+        entry['hostname'] = await lookup(entry['host'])
+        return entry
+
+    s = AsyncStreamer(reporter, parse, resolve, concurrency=100)
+    stats = s.consume(sys.stdin)
+
+This module requires Python 3.5 or later.
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import time
+
+from clitool import (
+    PROCESSING_SUCCESS,
+    PROCESSING_SKIPPED,
+    PROCESSING_ERROR,
+    PROCESSING_TOTAL,
+    PROCESSING_TIME
+)
+from clitool.processor import Chain, Streamer
+
+_DONE = object()
+
+
+def _is_coroutine(f):
+    return asyncio.iscoroutinefunction(f) or \
+        asyncio.iscoroutinefunction(getattr(f, '__call__', None))
+
+
+class AsyncStreamer(Streamer):
+    """ Streaming module to run coroutine procedures concurrently.
+    Rules of procedures and stats are same as :class:`Streamer`.
+
+    Up to ``concurrency`` items are processed at once on one event loop.
+    Consecutive procedures which are not coroutine function run on the
+    executor given by ``executor``, "thread" or "process", at once.
+    If executor is "serial" (default), they run on event loop directly.
+
+    Input stream is either of iterable or asynchronous iterable.
+
+    :param callback: function to collect parsed value
+    :type callback: callable
+    :param args: callables or coroutine functions
+    :type args: list
+    :param concurrency: maximum count of items processed at once
+        (default: 64)
+    :type concurrency: int
+    :param executor: kind of executor to run sync procedures
+    :type executor: string
+    :param processes: number of workers of executor
+    :type processes: int
+    """
+
+    def __init__(self, callback=None, *args, **kwargs):
+        self.concurrency = kwargs.pop('concurrency', 64)
+        if kwargs.get('checkpoint') is not None:
+            raise ValueError('Checkpoint is not supported by AsyncStreamer')
+        if kwargs.get('dead_letter') is not None:
+            raise ValueError('Dead letter is not supported by AsyncStreamer')
+        super(AsyncStreamer, self).__init__(callback, *args, **kwargs)
+        stages = []
+        for f in self.procedures:
+            if _is_coroutine(f):
+                stages.append((True, f))
+            elif stages and not stages[-1][0]:
+                stages[-1] = (False, Chain(stages[-1][1].procedures + (f, )))
+            else:
+                stages.append((False, Chain((f, ))))
+        self.stages = tuple(stages)
+
+    def _create_pool(self):
+        logging.debug("Start %s executor: workers=%s", self.executor,
+            self.processes)
+        if self.executor == 'thread':
+            return concurrent.futures.ThreadPoolExecutor(self.processes)
+        return concurrent.futures.ProcessPoolExecutor(self.processes)
+
+    def close(self):
+        """ Wait for workers to finish and shut down the executor.
+        """
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.shutdown(wait=True)
+
+    def terminate(self):
+        """ Shut down the executor without waiting for pending tasks.
+        """
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.shutdown(wait=False)
+
+    def consume(self, stream, source=None, chunksize=1, fileno=None,
+                sampling=None):
+        """ Run :meth:`consume_async` on new event loop and returns
+        processing stats. ``chunksize`` and ``fileno`` are accepted for
+        :class:`clitool.processor.CliHandler`, and ignored.
+
+        :param stream: streaming object to consume
+        :type stream: iterable or asynchronous iterable
+        :param source: source of stream to consume
+        :type source: string
+        :param sampling: rate of sampling already applied on the stream
+        :type sampling: float
+        :rtype: dict
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(
+                self.consume_async(stream, source, sampling))
+        finally:
+            loop.close()
+
+    async def _apply(self, item, pool):
+        loop = asyncio.get_event_loop()
+        for is_coroutine, f in self.stages:
+            if not item:
+                return
+            if is_coroutine:
+                item = await f(item)
+            elif pool is not None:
+                item = await loop.run_in_executor(pool, f, item)
+            else:
+                item = f(item)
+                if inspect.isawaitable(item):
+                    item = await item
+        return item
+
+    async def consume_async(self, stream, source=None, sampling=None):
+        """ Consuming given stream object and returns processing stats.
+
+        :param stream: streaming object to consume
+        :type stream: iterable or asynchronous iterable
+        :param source: source of stream to consume
+        :type source: string
+        :param sampling: rate of sampling already applied on the stream.
+            Bernoulli sampling of this streamer is not applied again.
+        :type sampling: float
+        :rtype: dict
+        """
+        stats = self._new_stats(source)
+        if not hasattr(stream, '__aiter__'):
+            stream = self._sampled(stream, stats, sampling)
+        elif self.sample or self.limit:
+            raise ValueError('Sampling of asynchronous iterable is not '
+                             'supported')
+        shared = self.pool is not None
+        if self.executor != 'serial' and not shared:
+            pool = self._create_pool()
+        else:
+            pool = self.pool
+        queue = asyncio.Queue(maxsize=2 * self.concurrency)
+
+        async def produce():
+            if hasattr(stream, '__aiter__'):
+                async for item in stream:
+                    await queue.put(item)
+            else:
+                for item in stream:
+                    await queue.put(item)
+            for _ in range(self.concurrency):
+                await queue.put(_DONE)
+
+        async def work():
+            while 1:
+                item = await queue.get()
+                if item is _DONE:
+                    return
+                processed = await self._apply(item, pool)
+                if processed is None:
+                    stats[PROCESSING_SKIPPED] += 1
+                elif processed is False:
+                    stats[PROCESSING_ERROR] += 1
+                else:
+                    stats[PROCESSING_SUCCESS] += 1
+                    self.collect(processed)
+                stats[PROCESSING_TOTAL] += 1
+                if stats[PROCESSING_TOTAL] % self.reporting_interval == 0:
+                    logging.info(" ===> Processed %dth item <=== ",
+                        stats[PROCESSING_TOTAL])
+
+        start = time.time()
+        tasks = [asyncio.ensure_future(produce())]
+        tasks.extend(asyncio.ensure_future(work())
+                     for _ in range(self.concurrency))
+        failed = interrupted = False
+        try:
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            logging.error(e)
+            failed = True
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except BaseException:
+            # KeyboardInterrupt or cancellation of this coroutine
+            logging.info("Stopped by interruption at %dth item.",
+                stats[PROCESSING_TOTAL])
+            interrupted = True
+            raise
+        finally:
+            for t in tasks:
+                t.cancel()
+            if pool is not None:
+                if interrupted:
+                    if shared:
+                        self.terminate()
+                    else:
+                        pool.shutdown(wait=False)
+                elif not shared:
+                    pool.shutdown(wait=not failed)
+                elif failed:
+                    self.terminate()
+                    self.open()
+            stats[PROCESSING_TIME] = time.time() - start
+            self._log_stats(stats)
+        return stats
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Checkpoint of long-running stream processing.
+
+:class:`Checkpoint` records processed position and stats of each source,
+and optional state of reporter, into one file periodically. Given to
+:class:`clitool.processor.Streamer` as ``checkpoint``, processing is resumed
+from recorded position on next run. ::
+
+    reporter = SimpleDictReporter()
+    checkpoint = Checkpoint('job.ckpt', reporter, resume=True)
+    s = Streamer(reporter, parse, checkpoint=checkpoint)
+    stats = s.consume(open('access_log'), source='access_log')
+
+If reporter has ``state()`` and ``restore(state)`` methods, its state is
+saved together and restored on resume. State must be picklable.
+"""
+
+import logging
+import os
+import pickle
+import time
+
+from clitool import (
+    PROCESSING_CHECKPOINT_SECONDS,
+    PROCESSING_SUCCESS,
+    PROCESSING_SKIPPED,
+    PROCESSING_ERROR,
+    PROCESSING_TOTAL,
+    PROCESSING_TIME
+)
+
+CHECKPOINT_VERSION = 1
+
+_STATS_KEYS = (PROCESSING_TOTAL, PROCESSING_SKIPPED, PROCESSING_SUCCESS,
+               PROCESSING_ERROR)
+
+
+def _replace(src, dst):
+    # os.replace is not available on Python 2, but rename is atomic on POSIX.
+    replace = getattr(os, 'replace', os.rename)
+    replace(src, dst)
+
+
+class Checkpoint(object):
+    """ Periodic and atomic checkpoint of consumed sources.
+
+    For each source, count of consumed items is recorded as ``position``.
+    Byte offset is also recorded as ``offset`` if items are bytes and
+    position is exact, on serial mode. On resume, stream is seeked to the
+    offset if possible, otherwise recorded count of items are skipped.
+    Stats of finished sources are returned without reading them again.
+
+    Checkpoint file is written into temporary file and renamed, so it is
+    never broken by interruption. Writing is done at most once in
+    ``interval`` seconds.
+
+    :param path: path of checkpoint file
+    :type path: string
+    :param reporter: callback of streamer which has ``state()`` and
+        ``restore(state)`` methods [optional]
+    :type reporter: object
+    :param interval: seconds between writes
+        (default: :const:`clitool.PROCESSING_CHECKPOINT_SECONDS`)
+    :type interval: float
+    :param resume: load existing checkpoint file (default: False)
+    :type resume: bool
+    """
+
+    def __init__(self, path, reporter=None, interval=None, resume=False):
+        self.path = path
+        self.reporter = reporter
+        if interval is None:
+            interval = PROCESSING_CHECKPOINT_SECONDS
+        self.interval = interval
+        self.sources = {}
+        if resume:
+            self.load()
+        self.due = time.time() + interval
+
+    def load(self):
+        """ Load checkpoint file and restore state of reporter.
+        Nothing is done if the file does not exist.
+
+        :rtype: bool
+        """
+        if not os.path.exists(self.path):
+            logging.warn('Checkpoint "%s" does not exist.', self.path)
+            return False
+        with open(self.path, 'rb') as fp:
+            data = pickle.load(fp)
+        if data.get('version') != CHECKPOINT_VERSION:
+            raise ValueError('Unknown version of checkpoint "{}"'.format(
+                self.path))
+        self.sources = data['sources']
+        state = data.get('reporter')
+        if state is not None and hasattr(self.reporter, 'restore'):
+            self.reporter.restore(state)
+        logging.info('Resume from checkpoint "%s": %d sources', self.path,
+            len(self.sources))
+        return True
+
+    def save(self):
+        """ Write checkpoint file atomically.
+        """
+        data = {
+            'version': CHECKPOINT_VERSION,
+            'sources': self.sources,
+            'reporter': None
+        }
+        if hasattr(self.reporter, 'state'):
+            data['reporter'] = self.reporter.state()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as fp:
+            pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+            fp.flush()
+            os.fsync(fp.fileno())
+        _replace(tmp, self.path)
+        self.due = time.time() + self.interval
+        logging.debug('Checkpoint is saved on "%s"', self.path)
+
+    def start(self, source):
+        """ Get record of given source.
+
+        :param source: source of stream
+        :type source: string
+        :rtype: dict which has ``stats``, ``position``, ``offset`` and
+            ``finished``, or None
+        """
+        return self.sources.get(source)
+
+    def update(self, source, stats, offset=None):
+        """ Record processed position of source and save if it is due.
+
+        :param source: source of stream
+        :type source: string
+        :param stats: processing stats including previous run
+        :type stats: dict
+        :param offset: byte offset of consumed items [optional]
+        :type offset: int
+        """
+        self._record(source, stats, offset, False)
+        if time.time() >= self.due:
+            self.save()
+
+    def finish(self, source, stats, offset=None):
+        """ Mark source as finished and save.
+
+        :param source: source of stream
+        :type source: string
+        :param stats: processing stats including previous run
+        :type stats: dict
+        :param offset: byte offset of consumed items [optional]
+        :type offset: int
+        """
+        self._record(source, stats, offset, True)
+        self.save()
+
+    def _record(self, source, stats, offset, finished):
+        record = dict((k, stats[k]) for k in _STATS_KEYS)
+        record[PROCESSING_TIME] = stats.get(PROCESSING_TIME, 0)
+        self.sources[source] = {
+            'stats': record,
+            'position': stats[PROCESSING_TOTAL],
+            'offset': offset,
+            'finished': finished
+        }
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
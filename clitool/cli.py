@@ -17,10 +17,43 @@ import argparse
 import warnings
 from functools import wraps
 
-from clitool import DEFAULT_ENCODING
+from clitool import DEFAULT_ENCODING, EXECUTORS, OUTPUT_FORMATS, PARTITIONS
 
 warnings.simplefilter("always")
 
+# Keywords of `clistream()` passed to `Streamer`.
+STREAMER_OPTIONS = ('processes', 'executor', 'fused', 'ordered', 'window',
+                    'batchsize', 'max_inflight', 'max_inflight_bytes',
+                    'instrument', 'reporting_seconds', 'sample', 'limit')
+
+
+def chunksize_type(value):
+    """ Argument type of ``--chunksize``, positive integer or ``auto``.
+    """
+    if value == 'auto':
+        return value
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise argparse.ArgumentTypeError(
+            "positive integer or 'auto' is expected: %s" % (value, ))
+    return size
+
+
+def sample_type(value):
+    """ Argument type of ``--sample``, rate in range of (0, 1].
+    """
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = 0
+    if not 0 < rate <= 1:
+        raise argparse.ArgumentTypeError(
+            "rate in range of (0, 1] is expected: %s" % (value, ))
+    return rate
+
 
 def base_parser():
     """ Create arguments parser with basic options and no help message.
@@ -32,8 +65,23 @@ def base_parser():
     * --basedir: base directory. (default=os.getcwd)
     * --input-encoding: input data encoding. (default=utf-8)
     * --output-encoding: output data encoding. (default=utf-8)
+    * --output-format: format of output records, "csv", "tsv", "jsonl"
+      or "ltsv".
     * --processes: count of processes.
-    * --chunksize: a number of chunks submitted to the process pool.
+    * --executor: kind of executor, "process", "thread" or "serial".
+    * --partition: unit of work distributed to workers, "file" or "range".
+    * --chunksize: a number of chunks submitted to the process pool,
+      or ``auto`` to tune it along with measured latency.
+    * --checkpoint: file to record processed position periodically.
+    * --resume: resume from the checkpoint.
+    * --dead-letter: file to write skipped and errored items.
+    * --dead-letter-rate: maximum count of dead letters in one second.
+    * --sample: process items sampled at given rate.
+    * --limit: process first N items of each file.
+    * --prefetch: decompress input files on another thread.
+    * --mmap: map plain input files to memory.
+    * --follow: follow lines appended to input file.
+    * --follow-offset: file to save offset on follow mode.
 
     :rtype: :class:`argparse.ArgumentParser`
     """
@@ -62,12 +110,65 @@ def base_parser():
                 default=DEFAULT_ENCODING,
                 help="encoding of output distination")
 
+    parser.add_argument("--output-format", dest="output_format",
+                choices=OUTPUT_FORMATS,
+                help="format of output records")
+
     parser.add_argument("--processes", dest="processes", type=int,
                 help="number of processes")
 
-    parser.add_argument("--chunksize", dest="chunksize", type=int,
+    parser.add_argument("--executor", dest="executor",
+                choices=EXECUTORS,
+                help="kind of executor to run procedures")
+
+    parser.add_argument("--partition", dest="partition",
+                choices=PARTITIONS,
+                help="unit of work distributed to workers")
+
+    parser.add_argument("--chunksize", dest="chunksize", type=chunksize_type,
                 default=1,
-                help="number of chunks submitted to the process pool")
+                help="number of chunks submitted to the process pool, "
+                     "or 'auto'")
+
+    parser.add_argument("--checkpoint", dest="checkpoint",
+                metavar="FILE",
+                help="file to record processed position periodically")
+
+    parser.add_argument("--resume", dest="resume",
+                default=False, action="store_true",
+                help="resume from checkpoint")
+
+    parser.add_argument("--dead-letter", dest="dead_letter",
+                metavar="FILE",
+                help="file to write skipped and errored items")
+
+    parser.add_argument("--dead-letter-rate", dest="dead_letter_rate",
+                type=int, default=1000,
+                help="maximum count of dead letters in one second")
+
+    parser.add_argument("--sample", dest="sample", type=sample_type,
+                metavar="RATE",
+                help="process items sampled at given rate")
+
+    parser.add_argument("--limit", dest="limit", type=int,
+                metavar="N",
+                help="process first N items of each file")
+
+    parser.add_argument("--prefetch", dest="prefetch",
+                default=False, action="store_true",
+                help="decompress input files on another thread")
+
+    parser.add_argument("--mmap", dest="mmap",
+                default=False, action="store_true",
+                help="map plain input files to memory")
+
+    parser.add_argument("--follow", dest="follow",
+                default=False, action="store_true",
+                help="follow lines appended to input file")
+
+    parser.add_argument("--follow-offset", dest="follow_offset",
+                metavar="FILE",
+                help="file to save offset on follow mode")
 
     group = parser.add_mutually_exclusive_group()
 
@@ -209,15 +310,36 @@ def clistream(reporter, *args, **kwargs):
     :type reporter: callable
     :param delimiter: line delimiter [optional]
     :type delimiter: string
+    :param partition: unit of work distributed to workers [optional]
+    :type partition: string
+    :param prefetch: decompress input files on another thread [optional]
+    :type prefetch: bool
+    :param mmap: map plain input files to memory [optional]
+    :type mmap: bool
+    :param follow: follow lines appended to input file [optional]
+    :type follow: bool
+    :param follow_offset: file to save offset on follow mode [optional]
+    :type follow_offset: string
+    :param checkpoint: path of checkpoint file [optional]
+    :type checkpoint: string
+    :param resume: resume from the checkpoint [optional]
+    :type resume: bool
+    :param dead_letter: path of file to write skipped and errored items
+        [optional]
+    :type dead_letter: string
+    :param dead_letter_rate: maximum count of dead letters in one second
+    :type dead_letter_rate: int
     :param args: functions to parse each item in the stream.
     :param kwargs: keywords, including ``files`` and ``input_encoding``.
+        Keywords listed on :const:`STREAMER_OPTIONS` are passed to
+        :class:`clitool.processor.Streamer`.
     :rtype: list
     """
     # Follow the rule of `parse_arguments()`
     files = kwargs.get('files')
     encoding = kwargs.get('input_encoding', DEFAULT_ENCODING)
-    processes = kwargs.get('processes')
-    chunksize = kwargs.get('chunksize')
+    chunksize = kwargs.get('chunksize') or 1
+    options = dict((k, kwargs[k]) for k in STREAMER_OPTIONS if k in kwargs)
 
     from clitool.processor import CliHandler, Streamer
     Handler = kwargs.get('Handler')
@@ -226,10 +348,30 @@ def clistream(reporter, *args, **kwargs):
             DeprecationWarning)
     else:
         Handler = CliHandler
-    s = Streamer(reporter, processes=processes, *args)
-    handler = Handler(s, kwargs.get('delimiter'))
+    if kwargs.get('checkpoint'):
+        from clitool.checkpoint import Checkpoint
+        options['checkpoint'] = Checkpoint(kwargs['checkpoint'], reporter,
+                                           resume=kwargs.get('resume'))
+    elif kwargs.get('resume'):
+        raise ValueError('No checkpoint is given to resume.')
+    dead_letter = None
+    if kwargs.get('dead_letter'):
+        from clitool.deadletter import DeadLetter
+        dead_letter = DeadLetter(kwargs['dead_letter'],
+                                 rate=kwargs.get('dead_letter_rate', 1000))
+        options['dead_letter'] = dead_letter
+    s = Streamer(reporter, *args, **options)
+    # Deprecated handler may not accept these keywords.
+    options = dict((k, kwargs[k]) for k in ('partition', 'prefetch', 'mmap',
+                                            'follow', 'follow_offset')
+                   if kwargs.get(k))
+    handler = Handler(s, kwargs.get('delimiter'), **options)
 
-    return handler.handle(files, encoding, chunksize)
+    try:
+        return handler.handle(files, encoding, chunksize)
+    finally:
+        if dead_letter is not None:
+            dead_letter.close()
 
 
 if __name__ == '__main__':
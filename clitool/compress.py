@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compressed input files.
+
+Compression is chosen by the last suffix of file name, and the suffix
+before it tells format of decompressed content. ::
+
+    >>> split_suffix('data.csv.gz')
+    ('.gz', '.csv')
+
+Supported suffixes are listed on :const:`CODECS`. ``.xz`` and ``.lzma``
+are available if :mod:`lzma` module exists (Python 3.3 or later), and
+refused by ``ValueError`` otherwise.
+
+Decompressed stream is read through large buffer. Set ``prefetch=True``
+to decompress on another thread, so that decompression overlaps with
+parsing. Since decompressors of standard library release GIL, this is
+effective even on CPU bound procedures.
+"""
+
+import bz2
+import gzip
+import io
+import os
+import threading
+
+from six.moves import queue
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# Size of buffer to read decompressed data.
+BUFFER_SIZE = 1024 * 1024
+
+CODECS = {
+    '.gz': gzip.GzipFile,
+    '.bz2': bz2.BZ2File
+}
+if lzma is not None:
+    CODECS['.xz'] = CODECS['.lzma'] = lzma.LZMAFile
+
+_LZMA_SUFFIXES = ('.xz', '.lzma')
+
+
+def split_suffix(name):
+    """ Split suffixes of compression and content.
+
+    :param name: file name
+    :type name: string
+    :rtype: tuple of suffix of compression or ``None``, and suffix of
+        content
+    """
+    root, suffix = os.path.splitext(name)
+    codec = suffix.lower()
+    if codec in CODECS:
+        return codec, os.path.splitext(root)[1]
+    if codec in _LZMA_SUFFIXES:
+        raise ValueError('Can not decompress "{}" without lzma module'.format(
+            name))
+    return None, suffix
+
+
+class _RawReader(io.RawIOBase):
+    """ Raw stream over file which has only ``read``, such as
+    :class:`bz2.BZ2File` of Python 2, to be buffered by
+    :class:`io.BufferedReader`.
+
+    :param fp: binary file to read
+    :type fp: file
+    """
+
+    def __init__(self, fp):
+        super(_RawReader, self).__init__()
+        self.fp = fp
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.fp.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        if not self.closed:
+            self.fp.close()
+        super(_RawReader, self).close()
+
+
+class PrefetchReader(io.RawIOBase):
+    """ Raw stream to read given file on another thread.
+    Up to ``depth`` chunks of ``chunksize`` bytes are read ahead.
+
+    :param fp: binary file to read
+    :type fp: file
+    :param chunksize: size of each read
+    :type chunksize: int
+    :param depth: count of chunks to read ahead
+    :type depth: int
+    """
+
+    def __init__(self, fp, chunksize=BUFFER_SIZE, depth=4):
+        super(PrefetchReader, self).__init__()
+        self.fp = fp
+        self.chunksize = chunksize
+        self.queue = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.chunk = memoryview(b'')
+        self.eof = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopped.is_set():
+                data = self.fp.read(self.chunksize)
+                self._put(data)
+                if not data:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.chunk:
+            if self.eof:
+                return 0
+            item = self.queue.get()
+            if isinstance(item, Exception):
+                self.eof = True
+                raise item
+            if not item:
+                self.eof = True
+                return 0
+            self.chunk = memoryview(item)
+        n = min(len(b), len(self.chunk))
+        b[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+        return n
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.fp.close()
+        super(PrefetchReader, self).close()
+
+
+def open_compressed(name, codec=None, bufsize=BUFFER_SIZE, prefetch=False):
+    """ Open compressed file to read decompressed bytes.
+
+    :param name: file name
+    :type name: string
+    :param codec: suffix of compression (default: suffix of ``name``)
+    :type codec: string
+    :param bufsize: size of buffer
+    :type bufsize: int
+    :param prefetch: decompress on another thread
+    :type prefetch: bool
+    :rtype: :class:`io.BufferedReader`
+    """
+    codec = codec or split_suffix(name)[0]
+    if codec not in CODECS:
+        raise ValueError('Unknown compression "{}"'.format(codec))
+    fp = CODECS[codec](name, 'rb')
+    if prefetch:
+        fp = PrefetchReader(fp, bufsize)
+    elif not hasattr(fp, 'readinto'):
+        fp = _RawReader(fp)
+    return io.BufferedReader(fp, bufsize)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Dead-letter output of rejected items.
+
+:class:`DeadLetter` writes raw input of skipped or errored items with the
+procedure which rejected it, given to :class:`clitool.processor.Streamer`
+as ``dead_letter``. Exceptions raised by procedures are caught and the
+items are counted as error while it is given. ::
+
+    with DeadLetter('rejected.jsonl', rate=100) as dl:
+        s = Streamer(reporter, parse, dead_letter=dl)
+        stats = s.consume(open('access_log'), source='access_log')
+
+Each line of output is JSON object, such as::
+
+    {"source": "access_log", "stage": "parse", "status": "error",
+     "error": "ValueError: bad line", "input": "..."}
+
+``stage`` is ``"input"`` if input item itself is falsy.
+"""
+
+import json
+import logging
+import time
+
+import six
+
+
+def _plain(value):
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if isinstance(value, six.binary_type):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class DeadLetter(object):
+    """ Buffered sink of rejected items with rate limit.
+
+    Records are buffered and written at once for every ``bufsize`` records.
+    At most ``rate`` records are written in one second, and following
+    records in the same second are dropped and counted as ``dropped``.
+
+    :param output: path or opened file to write
+    :type output: string or file
+    :param rate: maximum count of records in one second, ``None`` or ``0``
+        for unlimited (default: 1000)
+    :type rate: int
+    :param bufsize: count of records to buffer (default: 1000)
+    :type bufsize: int
+    :param skipped: write skipped items as well as errored ones
+        (default: True)
+    :type skipped: bool
+    """
+
+    def __init__(self, output, rate=1000, bufsize=1000, skipped=True):
+        if isinstance(output, six.string_types):
+            self.fp = open(output, 'w')
+            self.owned = True
+        else:
+            self.fp = output
+            self.owned = False
+        self.rate = rate
+        self.bufsize = bufsize
+        self.skipped = skipped
+        self.buf = []
+        self.second = None
+        self.count = 0
+        self.written = 0
+        self.dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, records, source=None):
+        """ Write rejected items.
+
+        :param records: tuples of input item, name of stage, status
+            ("skipped" or "error") and exception text or ``None``
+        :type records: list
+        :param source: source of items
+        :type source: string
+        """
+        second = int(time.time())
+        if second != self.second:
+            self.second = second
+            self.count = 0
+        for item, stage, status, error in records:
+            if status == 'skipped' and not self.skipped:
+                continue
+            if self.rate and self.count >= self.rate:
+                self.dropped += 1
+                continue
+            self.count += 1
+            record = {'stage': stage, 'status': status, 'error': error,
+                      'input': _plain(item)}
+            if source:
+                record['source'] = source
+            self.buf.append(json.dumps(record, default=repr,
+                                       separators=(',', ':')))
+        if len(self.buf) >= self.bufsize:
+            self.flush()
+
+    def flush(self):
+        """ Write buffered records.
+        """
+        if self.buf:
+            self.buf.append('')
+            self.fp.write('\n'.join(self.buf))
+            self.written += len(self.buf) - 1
+            self.buf = []
+        self.fp.flush()
+
+    def close(self):
+        """ Flush buffered records and close output if it is opened by
+        this object.
+        """
+        self.flush()
+        if self.dropped:
+            logging.warn("Dead letter dropped %d items over rate limit.",
+                self.dropped)
+        logging.info("Dead letter wrote %d items.", self.written)
+        if self.owned:
+            self.fp.close()
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
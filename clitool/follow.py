@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Follow growing file such as ``tail -F``.
+
+:class:`Follower` iterates lines appended to a file endlessly. Rotated or
+truncated file is detected and reopened, and read offset is saved to
+resume from it on next run. ::
+
+    follower = Follower('/var/log/httpd/access_log', offset='access.offset')
+    try:
+        s = Streamer(reporter, parse)
+        s.consume(follower, source=follower.name)
+    finally:
+        follower.close()
+
+:class:`clitool.processor.CliHandler` follows the input file by
+``follow=True`` (``--follow``) and ``follow_offset`` (``--follow-offset``).
+"""
+
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from clitool import FOLLOW_MIN_INTERVAL, FOLLOW_MAX_INTERVAL
+from clitool.checkpoint import _replace
+
+# size of each read of appended data
+FOLLOW_BUFFER_SIZE = 1024 * 1024
+
+
+class Follower(object):
+    """ Lines appended to a file.
+
+    Appended data is read up to ``bufsize`` bytes at once, and complete
+    lines are given. Last line without line ending is kept until the rest
+    of it is written. While no data is appended, file is polled at
+    ``interval`` seconds, and the interval is doubled up to
+    ``max_interval`` seconds on each idle poll. It is reset on new data, so
+    that latency is low on busy file without busy loop on idle one.
+
+    On each idle poll, the path is checked as ``tail -F`` does:
+
+    - If the path refers to another file by device and inode, the file is
+      rotated. Rest of current file is read, then the new file is opened
+      and read from the beginning.
+    - If size of the file is less than read position, the file is truncated
+      and read from the beginning.
+    - If the path does not exist, current file is kept until new one is
+      created.
+
+    If ``offset`` is given, inode and offset of the file are saved into it
+    atomically, when it is idle or every ``save_interval`` seconds and on
+    :meth:`close`. Line is counted in the offset when next line is requested,
+    so that lines are processed at least once on restart. If the saved
+    inode matches the file, reading is resumed from the saved offset.
+    Otherwise it starts from the end of the file, or the beginning if
+    ``from_start`` is true.
+
+    Lines are given as bytes, or decoded if ``encoding`` is given. Iteration
+    ends only if ``idle_timeout`` is given and no data is appended in the
+    seconds, or :meth:`close` is called. :meth:`close` may be called from
+    another thread, and iteration stops without waiting for the poll.
+
+    Since offset counts lines requested by the iterating thread, lines must
+    be processed on it to be resumed exactly. Do not give follower to a
+    worker pool which reads input ahead on its own thread.
+
+    :param name: path of file to follow
+    :type name: string
+    :param offset: path of file to save offset [optional]
+    :type offset: string
+    :param encoding: encoding to decode lines [optional]
+    :type encoding: string
+    :param from_start: read existing data without saved offset
+        (default: False)
+    :type from_start: bool
+    :param interval: initial seconds to poll
+        (default: :const:`clitool.FOLLOW_MIN_INTERVAL`)
+    :type interval: float
+    :param max_interval: maximum seconds to poll
+        (default: :const:`clitool.FOLLOW_MAX_INTERVAL`)
+    :type max_interval: float
+    :param idle_timeout: seconds to stop after no data is appended
+        [optional]
+    :type idle_timeout: float
+    :param bufsize: size of each read
+    :type bufsize: int
+    :param save_interval: seconds between saves of offset while data is
+        appended continuously (default: 5)
+    :type save_interval: float
+    """
+
+    def __init__(self, name, offset=None, encoding=None, from_start=False,
+                 interval=None, max_interval=None, idle_timeout=None,
+                 bufsize=FOLLOW_BUFFER_SIZE, save_interval=5.0):
+        self.name = name
+        self.offset_path = offset
+        self.encoding = encoding
+        self.interval = interval or FOLLOW_MIN_INTERVAL
+        self.max_interval = max(self.interval,
+                                max_interval or FOLLOW_MAX_INTERVAL)
+        self.idle_timeout = idle_timeout
+        self.bufsize = bufsize
+        self.save_interval = save_interval
+        self.closed = False
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.fp = None
+        self.inode = None
+        self.position = 0
+        self.saved = None
+        saved = self._load()
+        self._open()
+        if saved and saved['inode'] == self.inode and \
+                saved['offset'] <= os.fstat(self.fp.fileno()).st_size:
+            self.position = saved['offset']
+        elif saved:
+            logging.warn('"%s" is rotated or truncated since offset is '
+                'saved, read from the beginning.', name)
+        elif not from_start:
+            self.position = os.fstat(self.fp.fileno()).st_size
+        self.fp.seek(self.position)
+        logging.info('Follow "%s" from %d byte.', name, self.position)
+
+    def _open(self):
+        self.fp = io.open(self.name, 'rb', 0)
+        st = os.fstat(self.fp.fileno())
+        self.inode = (st.st_dev, st.st_ino)
+        self.position = 0
+
+    def _load(self):
+        path = self.offset_path
+        if not path or not os.path.exists(path):
+            return
+        with open(path) as fp:
+            saved = json.load(fp)
+        saved['inode'] = tuple(saved['inode'])
+        self.saved = (saved['inode'], saved['offset'])
+        return saved
+
+    def save(self):
+        """ Write inode and offset of the file atomically.
+        """
+        if not self.offset_path or self.saved == (self.inode, self.position):
+            return
+        tmp = self.offset_path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump({'name': self.name, 'inode': self.inode,
+                       'offset': self.position}, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        _replace(tmp, self.offset_path)
+        self.saved = (self.inode, self.position)
+
+    def _check(self):
+        """ Check the path, and return "rotated" if it refers to another
+        file, "truncated" if the file is shorter than read position,
+        otherwise ``None``.
+        """
+        try:
+            st = os.stat(self.name)
+        except OSError:
+            return
+        if (st.st_dev, st.st_ino) != self.inode:
+            return 'rotated'
+        if st.st_size < self.position:
+            return 'truncated'
+
+    def __iter__(self):
+        if self.encoding:
+            return self._decoded()
+        return self._lines()
+
+    def _decoded(self):
+        encoding = self.encoding
+        for line in self._lines():
+            yield line.decode(encoding)
+
+    def _lines(self):
+        rest = b''
+        interval = self.interval
+        idle = 0.0
+        drained = False
+        due = time.time() + self.save_interval
+        while 1:
+            with self.lock:
+                if self.stopped.is_set():
+                    return
+                data = self.fp.read(self.bufsize)
+            if data:
+                chunk = rest + data if rest else data
+                end = chunk.rfind(b'\n') + 1
+                rest = chunk[end:]
+                if end:
+                    for line in io.BytesIO(chunk[:end]):
+                        yield line
+                        # Line is consumed when next one is requested.
+                        self.position += len(line)
+                interval = self.interval
+                idle = 0.0
+                drained = False
+                if time.time() >= due:
+                    with self.lock:
+                        self.save()
+                    due = time.time() + self.save_interval
+                continue
+            with self.lock:
+                if self.stopped.is_set():
+                    return
+                self.save()
+                change = self._check()
+                if change == 'rotated' and not drained:
+                    # Writer may append to rotated file until it reopens.
+                    drained = True
+                    continue
+                drained = False
+                if change == 'rotated':
+                    logging.info('"%s" is rotated.', self.name)
+                    self.fp.close()
+                    self._open()
+                elif change == 'truncated':
+                    logging.info('"%s" is truncated.', self.name)
+                    self.fp.seek(0)
+                    self.position = 0
+                    rest = b''
+            if change == 'rotated' and rest:
+                # Last line of rotated file has no line ending.
+                yield rest
+                rest = b''
+            if change:
+                interval = self.interval
+                continue
+            if self.idle_timeout is not None and idle >= self.idle_timeout:
+                break
+            self.stopped.wait(interval)
+            idle += interval
+            interval = min(interval * 2, self.max_interval)
+
+    def close(self):
+        """ Stop iteration, save offset and close the file.
+        """
+        self.stopped.set()
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.save()
+                self.fp.close()
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -4,34 +4,58 @@
 """ Stream processing utility.
 """
 
-import gzip
-import json
+import codecs
+import copy
+import io
+import itertools
 import logging
+import math
+import mmap
 import multiprocessing
+import multiprocessing.pool
 import os
+import random
+import stat
 import sys
+import threading
 import time
 import warnings
-from collections import Counter
+from collections import Counter, defaultdict
 
+import six
 from six import PY3
 from six.moves import map as imap
 from six.moves import filter as ifilter
 
 from clitool import (
+    EXECUTORS,
+    PARTITIONS,
     PROCESSING_REPORTING_INTERVAL,
+    PROCESSING_REPORTING_SECONDS,
     PROCESSING_SUCCESS,
     PROCESSING_SKIPPED,
     PROCESSING_ERROR,
     PROCESSING_TOTAL,
-    PROCESSING_TIME
+    PROCESSING_TIME,
+    PROCESSING_CHUNKSIZE,
+    PROCESSING_INFLIGHT,
+    PROCESSING_INFLIGHT_BYTES,
+    PROCESSING_PROCEDURES,
+    PROCESSING_SAMPLING
 )
+from clitool.compress import open_compressed, split_suffix
+from clitool.follow import Follower
+from clitool.textio import MappedLines, byte_lines, json_array, json_lines
 
 warnings.simplefilter("always")
 
+# suffixes of JSON Lines
+_JSON_LINES = ('.jsonl', '.ndjson')
+# suffixes of content which is read as text
+_TEXT_SUFFIXES = ('.json', '.csv', '.tsv') + _JSON_LINES
+
 if PY3:
     import csv
-    import io
 
     def csvreader3(fp, encoding, **kwargs):
         buf = getattr(fp, 'buffer', None)
@@ -52,14 +76,40 @@ else:
     csvreader = csvreader2
 
 
+def _int_dict():
+    return defaultdict(int)
+
+
 class SimpleDictReporter(object):
     """ Reporting class for streamer API.
     Passing processed data as mapping object, report the key/value pair
     if value is string. To call ``report()``, you can get the result as dict.
+
+    Values are counted on ``defaultdict(int)`` of each field. To count
+    values of other types such as integer status code, give
+    ``types``. To count only some fields, give ``fields``. ::
+
+        reporter = SimpleDictReporter(fields=('method', 'status'),
+                                      types=(str, int))
+        reporter.counters['status'][404]
+
+    This reporter is mergeable. Reporter which has ``fork()``, ``state()``
+    and ``merge(state)`` methods is forked in each worker of
+    :class:`Streamer`, and only its partial state is sent back to be merged
+    into the original reporter, for each batch or file.
+    Merging has to be independent of the order of states.
+
+    :param fields: names of fields to count [optional]
+    :type fields: iterable
+    :param types: types of values to count (default: ``(str, )``)
+    :type types: tuple
     """
 
     def __init__(self, *args, **kwargs):
-        self.counter = Counter()
+        fields = kwargs.get('fields')
+        self.fields = tuple(fields) if fields else None
+        self.types = frozenset(kwargs.get('types', (str, )))
+        self.counters = defaultdict(_int_dict)
 
     def __call__(self, entry):
         """
@@ -68,16 +118,73 @@ class SimpleDictReporter(object):
         """
         if type(entry) is not dict:
             return
-        for k in entry:
-            v = entry[k]
-            if type(v) == str:
-                self.counter[k + ":" + v] += 1
+        counters = self.counters
+        types = self.types
+        if self.fields is None:
+            items = entry.items()
+        else:
+            items = ((k, entry[k]) for k in self.fields if k in entry)
+        for k, v in items:
+            if type(v) in types:
+                counters[k][v] += 1
+
+    @property
+    def counter(self):
+        """ Counts of ``"key:value"`` in new :class:`collections.Counter`.
+        Updating it does not change counts of the reporter.
+        """
+        return Counter(self.report())
 
     def report(self):
+        """ Counts of ``"key:value"``.
+
+        :rtype: dict
+        """
+        return dict((k + ":" + (v if type(v) == str else str(v)), n)
+                    for k, c in self.counters.items() for v, n in c.items())
+
+    def report_fields(self):
+        """ Counts of values for each field.
+
+        :rtype: dict of dict
         """
+        return dict((k, dict(c)) for k, c in self.counters.items())
+
+    def fork(self):
+        """ Empty copy of this reporter to aggregate in worker.
+
+        :rtype: SimpleDictReporter
+        """
+        reporter = copy.copy(self)
+        reporter.counters = defaultdict(_int_dict)
+        return reporter
+
+    def state(self):
+        """ Picklable state to save on checkpoint or to merge.
+
         :rtype: dict
         """
-        return dict(self.counter)
+        return self.report_fields()
+
+    def merge(self, state):
+        """ Add partial state of forked reporter.
+
+        :param state: state returned by :meth:`state`
+        :type state: dict
+        """
+        for k, values in state.items():
+            c = self.counters[k]
+            for v, n in values.items():
+                c[v] += n
+
+    def restore(self, state):
+        """ Restore state saved by :meth:`state`.
+
+        :param state: saved state
+        :type state: dict
+        """
+        self.counters = defaultdict(_int_dict)
+        self.merge(state)
 
 
 class RowMapper(object):
@@ -129,8 +236,624 @@ class RowMapper(object):
         logging.error(RowMapper.ERRMSG, len(self.header), len(row))
 
 
-# Can not recycle pool . . .
-# http://stackoverflow.com/questions/5481104/multiprocessing-pool-imap-broken
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class ProcedureProfile(object):
+    """ Timing and result counts for each procedure of :class:`Chain`.
+
+    Latency of each item is counted on histogram of which bucket is
+    a quarter of power of two seconds, and upper bound of the bucket is
+    reported, so percentiles are approximated within 25% error.
+    For procedure marked by :func:`batched`, latency of each item is the
+    time of the call divided by count of items.
+    Profiles are mergeable to sum up them from workers.
+
+    :param names: names of procedures
+    :type names: list
+    """
+
+    # buckets from 2^-30 sec (1 nsec) to 2^10 sec
+    MIN_EXPONENT = -30
+    MAX_EXPONENT = 10
+    SUBBUCKETS = 4
+
+    def __init__(self, names):
+        self.names = list(names)
+        size = (self.MAX_EXPONENT - self.MIN_EXPONENT) * self.SUBBUCKETS
+        self.counters = [{'calls': 0, 'items': 0, 'time': 0.0,
+                          'skipped': 0, 'error': 0} for _ in self.names]
+        self.histograms = [[0] * size for _ in self.names]
+
+    def _bucket(self, latency):
+        if latency <= 0:
+            return 0
+        m, e = math.frexp(latency)
+        e = min(max(e, self.MIN_EXPONENT), self.MAX_EXPONENT - 1)
+        sub = int((m - 0.5) * 2 * self.SUBBUCKETS)
+        return (e - self.MIN_EXPONENT) * self.SUBBUCKETS + sub
+
+    def _bound(self, bucket):
+        e, sub = divmod(bucket, self.SUBBUCKETS)
+        m = 0.5 + (sub + 1) / (2.0 * self.SUBBUCKETS)
+        return math.ldexp(m, e + self.MIN_EXPONENT)
+
+    def add(self, index, elapsed, results):
+        """ Record one call of `index` th procedure.
+
+        :param index: index of procedure
+        :type index: int
+        :param elapsed: seconds of the call
+        :type elapsed: float
+        :param results: results of the call
+        :type results: list
+        """
+        c = self.counters[index]
+        n = len(results)
+        c['calls'] += 1
+        c['items'] += n
+        c['time'] += elapsed
+        for r in results:
+            if r is False:
+                c['error'] += 1
+            elif not r:
+                c['skipped'] += 1
+        if n:
+            self.histograms[index][self._bucket(elapsed / n)] += n
+
+    def merge(self, other):
+        """ Add up counters of other profile.
+
+        :param other: profile of same procedures
+        :type other: ProcedureProfile
+        """
+        for c, o in zip(self.counters, other.counters):
+            for k in c:
+                c[k] += o[k]
+        for h, o in zip(self.histograms, other.histograms):
+            for i, v in enumerate(o):
+                h[i] += v
+
+    def percentile(self, index, q):
+        """ Approximate latency at `q` percent of `index` th procedure.
+
+        :rtype: float
+        """
+        h = self.histograms[index]
+        total = sum(h)
+        if not total:
+            return 0.0
+        rank = total * q / 100.0
+        count = 0
+        for bucket, v in enumerate(h):
+            count += v
+            if v and count >= rank:
+                return self._bound(bucket)
+        return self._bound(len(h) - 1)
+
+    def report(self):
+        """
+        :rtype: list of dict
+        """
+        out = []
+        for i, name in enumerate(self.names):
+            r = dict(self.counters[i])
+            r['name'] = name
+            for q in (50, 95, 99):
+                r['p%d' % (q, )] = self.percentile(i, q)
+            out.append(r)
+        return out
+
+
+def batched(func):
+    """ Mark procedure of :class:`Streamer` as batch-aware.
+    Batch-aware procedure accepts list of items and returns list of
+    results in the same length. Each result follows the rule of procedure,
+    ``None`` to skip and ``False`` to report error. ::
+
+        @batched
+        def lookup(hosts):
+            names = resolve_all(hosts)
+            return [names.get(h) for h in hosts]
+
+    Callable object can be marked by class attribute ``batched = True``.
+
+    :param func: procedure to mark
+    :type func: callable
+    :rtype: callable
+    """
+    func.batched = True
+    return func
+
+
+def bytes_aware(func):
+    """ Mark the first procedure of :class:`Streamer` as bytes-aware.
+    :class:`CliHandler` gives lines of plain text file to bytes-aware
+    procedure as ``bytes`` without decoding, so that procedure decodes only
+    lines or fields to keep by :func:`clitool.textio.decode`. ::
+
+        @bytes_aware
+        def errors(line):
+            if b'" 500 ' in line:
+                return parse(decode(line))
+
+    Lines of ``.csv``, ``.tsv``, ``.json`` and JSON Lines, or with
+    delimiter, are decoded as before. Callable object can be marked by
+    class attribute ``bytes_aware = True``.
+
+    :param func: procedure to mark
+    :type func: callable
+    :rtype: callable
+    """
+    func.bytes_aware = True
+    return func
+
+
+def _live(results):
+    """ Indexes of truthy results. Falsy ones are replaced by ``None``.
+    """
+    live = []
+    for i, r in enumerate(results):
+        if r:
+            live.append(i)
+        else:
+            results[i] = None
+    return live
+
+
+class Chain(object):
+    """ Composed procedures of :class:`Streamer` to be called at once.
+    Falsy value returned by intermediate procedure stops the chain and
+    ``None`` is returned (skipped), same as serial execution of streamer.
+    Value returned by the last procedure is returned as it is.
+
+    Since this object is picklable as long as each procedure is picklable,
+    whole chain runs in one worker process and only final result goes back
+    to parent process.
+
+    Procedures marked by :func:`batched` are called once for each batch
+    by :meth:`batch`, others are called for each item.
+
+    :param procedures: callables
+    :type procedures: tuple
+    """
+
+    def __init__(self, procedures):
+        self.procedures = tuple(procedures)
+        self.batched = any(getattr(f, 'batched', False)
+                           for f in self.procedures)
+
+    def __len__(self):
+        return len(self.procedures)
+
+    def __call__(self, item):
+        if self.batched:
+            return self.batch([item])[0]
+        for f in self.procedures:
+            if not item:
+                return
+            item = f(item)
+        return item
+
+    def names(self):
+        """ Names of procedures.
+
+        :rtype: list
+        """
+        return [getattr(f, '__name__', type(f).__name__)
+                for f in self.procedures]
+
+    def batch(self, items, profile=None, rejects=None):
+        """ Apply procedures on list of items.
+
+        If ``rejects`` is given, exception raised by procedure is caught
+        and the item is reported as error. Each skipped or errored item is
+        appended to ``rejects`` as tuple of its index in ``items``, index of
+        the procedure or ``None`` for falsy input, and the exception text.
+
+        :param items: list of items
+        :type items: list
+        :param profile: profile to record timings on
+        :type profile: ProcedureProfile
+        :param rejects: list to append rejected items on
+        :type rejects: list
+        :rtype: list of results
+        """
+        if profile is not None or rejects is not None:
+            return self._checked_batch(items, profile, rejects)
+        results = list(items)
+        for f in self.procedures:
+            live = _live(results)
+            if not live:
+                break
+            if getattr(f, 'batched', False):
+                out = f([results[i] for i in live])
+                if len(out) != len(live):
+                    raise ValueError('Size differ: expected={}, actual={}'
+                        .format(len(live), len(out)))
+                for i, r in zip(live, out):
+                    results[i] = r
+            else:
+                for i in live:
+                    results[i] = f(results[i])
+        return results
+
+    def _checked_batch(self, items, profile, rejects):
+        results = list(items)
+        if rejects is not None:
+            rejects.extend((i, None, None) for i, r in enumerate(results)
+                           if not r)
+        last = len(self.procedures) - 1
+        for index, f in enumerate(self.procedures):
+            live = _live(results)
+            if not live:
+                break
+            errors = {}
+            if getattr(f, 'batched', False):
+                t = _timer()
+                try:
+                    out = f([results[i] for i in live])
+                except Exception:
+                    if rejects is None:
+                        raise
+                    out = [False] * len(live)
+                    errors = dict.fromkeys(live, _describe())
+                if profile is not None:
+                    profile.add(index, _timer() - t, out)
+                if len(out) != len(live):
+                    raise ValueError('Size differ: expected={}, actual={}'
+                        .format(len(live), len(out)))
+                for i, r in zip(live, out):
+                    results[i] = r
+            else:
+                for i in live:
+                    t = _timer()
+                    try:
+                        r = f(results[i])
+                    except Exception:
+                        if rejects is None:
+                            raise
+                        r = False
+                        errors[i] = _describe()
+                    if profile is not None:
+                        profile.add(index, _timer() - t, (r, ))
+                    results[i] = r
+            if rejects is not None:
+                for i in live:
+                    r = results[i]
+                    if r is None or r is False or (not r and index < last):
+                        rejects.append((i, index, errors.get(i)))
+        return results
+
+
+def _describe():
+    """ Short description of current exception.
+    """
+    e = sys.exc_info()[1]
+    return '{}: {}'.format(type(e).__name__, e)
+
+
+def _batches(stream, size):
+    batch = []
+    for item in stream:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Marker of result which is already collected by reporter in worker.
+_MERGED = object()
+
+
+def _mergeable(reporter):
+    return all(callable(getattr(reporter, m, None))
+               for m in ('fork', 'state', 'merge'))
+
+
+def _rejected(chain, items, results, rejects):
+    """ Records of rejected items for dead-letter sink.
+    """
+    names = chain.names()
+    return [(items[i], 'input' if stage is None else names[stage],
+             'error' if results[i] is False else 'skipped', error)
+            for i, stage, error in rejects]
+
+
+class _Outcome(object):
+    """ Results of one batch processed by worker with its timings.
+    Worker is identified by process ID and thread ID, since every thread of
+    thread pool has same process ID.
+    """
+
+    def __init__(self, results, nbytes, dispatched, started, finished,
+                 worker, profile=None, rejects=None, state=None):
+        self.results = results
+        self.profile = profile
+        self.rejects = rejects
+        self.state = state
+        self.nbytes = nbytes
+        self.dispatched = dispatched
+        self.started = started
+        self.finished = finished
+        self.worker = worker
+
+
+class _BatchTask(object):
+    """ Worker side of :class:`Streamer` to apply chain on each batch.
+    """
+
+    def __init__(self, chain, instrument=False, reject=False, reporter=None):
+        self.chain = chain
+        self.instrument = instrument
+        self.reject = reject
+        self.reporter = reporter
+
+    def __call__(self, args):
+        dispatched, nbytes, items = args
+        started = time.time()
+        if self.instrument:
+            profile = ProcedureProfile(self.chain.names())
+        else:
+            profile = None
+        rejects = [] if self.reject else None
+        results = self.chain.batch(items, profile, rejects)
+        if rejects:
+            rejects = _rejected(self.chain, items, results, rejects)
+        state = None
+        if self.reporter is not None:
+            reporter = self.reporter.fork()
+            for i, r in enumerate(results):
+                if r is not None and r is not False:
+                    reporter(r)
+                    results[i] = 1
+            state = reporter.state()
+        return _Outcome(results, nbytes, dispatched, started, time.time(),
+                        (os.getpid(), threading.current_thread().ident),
+                        profile, rejects, state)
+
+
+class _StageBatch(object):
+    """ Worker side of :class:`Streamer` on unfused mode to apply one
+    procedure marked by :func:`batched` on a batch.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def __call__(self, items):
+        return self.chain.batch(items)
+
+
+class _Throttle(object):
+    """ Limit batches, items and bytes submitted to workers but not
+    collected yet. Since process pool pulls input on its own thread,
+    :meth:`acquire` blocks that thread until :meth:`release` is called by
+    consumer. At least one batch is always allowed not to stall the stream.
+    Peak count of items and bytes in flight are kept as ``peak``.
+
+    :param batches: maximum count of batches in flight
+    :type batches: int
+    :param items: maximum count of items in flight
+    :type items: int
+    :param nbytes: maximum size of items in flight
+    :type nbytes: int
+    """
+
+    def __init__(self, batches=None, items=None, nbytes=None):
+        self.limits = (batches, items, nbytes)
+        self.inflight = [0, 0, 0]
+        self.peak = [0, 0, 0]
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def _full(self, n, nbytes):
+        if not self.inflight[0]:
+            return False
+        for limit, current, size in zip(self.limits, self.inflight,
+                                        (1, n, nbytes)):
+            if limit and current + size > limit:
+                return True
+        return False
+
+    def acquire(self, n=1, nbytes=0):
+        """ Wait for room of a batch which has `n` items of `nbytes`.
+        False is returned after closed.
+        """
+        with self.cond:
+            while not self.closed and self._full(n, nbytes):
+                self.cond.wait()
+            if self.closed:
+                return False
+            for i, size in enumerate((1, n, nbytes)):
+                self.inflight[i] += size
+                self.peak[i] = max(self.peak[i], self.inflight[i])
+            return True
+
+    def release(self, n=1, nbytes=0):
+        with self.cond:
+            for i, size in enumerate((1, n, nbytes)):
+                self.inflight[i] -= size
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+_SIZED = (six.binary_type, six.text_type, bytearray, memoryview)
+
+
+def _sizeof(item):
+    """ Approximate size of input item in bytes.
+    """
+    if isinstance(item, _SIZED):
+        return len(item)
+    if isinstance(item, (list, tuple)):
+        return sum(_sizeof(v) for v in item)
+    return sys.getsizeof(item)
+
+
+class _ChunkTuner(object):
+    """ Choose chunk size from timings of completed batches.
+
+    During first ``warmup`` items, per-item latency measured in worker is
+    used to size a batch to take ``target`` seconds. If a worker was idle
+    longer than it was busy, the parent can not feed workers fast enough,
+    so chunk size is doubled. If queue wait plus processing time of a batch
+    exceeds ``latency`` seconds, chunk size is halved.
+    Change of each step is limited to twice. After warming up, chunk size
+    is fixed.
+    """
+
+    initial = 1
+    maximum = 65536
+    target = 0.01
+    latency = 0.1
+    warmup = 4096
+
+    def __init__(self):
+        self.size = self.initial
+        self.items = 0
+        self.finished = {}
+
+    def update(self, outcome):
+        n = len(outcome.results)
+        busy = outcome.finished - outcome.started
+        wait = outcome.started - outcome.dispatched
+        last = self.finished.get(outcome.worker, outcome.started)
+        idle = max(0, outcome.started - last)
+        self.finished[outcome.worker] = outcome.finished
+        if self.items >= self.warmup or not n:
+            return
+        self.items += n
+        if busy > 0:
+            ideal = self.target / (busy / n)
+        else:
+            ideal = self.size * 2
+        if idle > busy:
+            ideal = max(ideal, self.size * 2)
+        elif wait + busy > self.latency:
+            ideal = min(ideal, self.size // 2)
+        ideal = min(max(int(ideal), self.size // 2), self.size * 2)
+        size = min(max(ideal, 1), self.maximum)
+        if size != self.size:
+            logging.debug("Chunk size: %d -> %d (latency=%f, wait=%f)",
+                self.size, size, busy / n, wait)
+            self.size = size
+
+
+def _humanize(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024:
+            break
+        nbytes /= 1024.0
+    return '%.1f%s' % (nbytes, unit)
+
+
+class _Progress(object):
+    """ Log processing rate every ``interval`` seconds.
+
+    If file descriptor of the source is given, read position of the file
+    is used as processed bytes, and percentage and ETA are also reported
+    when the source is a regular file. Otherwise size of text or binary
+    items is counted by :meth:`count`.
+    Recent rate is exponential moving average of rates on each interval.
+    Clock is read by :meth:`check` about ``checks`` times in an interval.
+    """
+
+    smoothing = 0.3
+    checks = 10
+    stride = 1024
+
+    def __init__(self, interval, fileno=None):
+        self.interval = interval
+        self.fileno = fileno
+        self.size = None
+        if fileno is not None:
+            try:
+                st = os.fstat(fileno)
+                os.lseek(fileno, 0, os.SEEK_CUR)
+                if stat.S_ISREG(st.st_mode):
+                    self.size = st.st_size
+            except OSError:
+                self.fileno = None
+        self.nbytes = 0
+        self.start = self.last = time.time()
+        self.due = self.start + interval
+        self.next_check = 1
+        self.last_items = self.last_bytes = 0
+        self.rate = self.byte_rate = None
+
+    def count(self, stream):
+        """ Count size of items passing through. If an item is not text
+        nor binary, such as row, bytes are not counted any more and only
+        rate of items is reported.
+        """
+        it = iter(stream)
+        for item in it:
+            if not isinstance(item, _SIZED):
+                self.nbytes = None
+                yield item
+                for item in it:
+                    yield item
+                return
+            self.nbytes += len(item)
+            yield item
+
+    def check(self, items):
+        """ Report if interval has passed, and schedule next check of the
+        clock on count of ``items``.
+        """
+        now = time.time()
+        if now >= self.due:
+            self.report(items, now)
+        elapsed = now - self.start
+        if elapsed > 0:
+            stride = int(items / elapsed * self.interval / self.checks)
+        else:
+            stride = self.stride
+        self.next_check = items + min(max(stride, 1), self.stride)
+
+    def position(self):
+        if self.fileno is None:
+            return self.nbytes
+        try:
+            return os.lseek(self.fileno, 0, os.SEEK_CUR)
+        except OSError:
+            return self.last_bytes
+
+    def report(self, items, now):
+        pos = self.position()
+        elapsed = (now - self.last) or self.interval
+        rate = (items - self.last_items) / elapsed
+        byte_rate = None if pos is None else \
+            (pos - self.last_bytes) / elapsed
+        if self.rate is None:
+            self.rate, self.byte_rate = rate, byte_rate
+        else:
+            a = self.smoothing
+            self.rate = a * rate + (1 - a) * self.rate
+            if byte_rate is not None:
+                self.byte_rate = a * byte_rate + (1 - a) * self.byte_rate
+        total = now - self.start
+        msg = " ===> Processed %d items, %.1f items/sec (recent %.1f)" % (
+            items, items / total, self.rate)
+        if pos is not None:
+            msg += ", %s/sec" % (_humanize(pos / total), )
+        if self.size:
+            msg += ", %.1f%%" % (100.0 * min(pos, self.size) / self.size, )
+            if self.byte_rate > 0:
+                eta = max(0, self.size - pos) / self.byte_rate
+                msg += ", ETA %dm%02ds" % divmod(int(eta), 60)
+        logging.info(msg + " <=== ")
+        self.last, self.last_items, self.last_bytes = now, items, pos
+        self.due = now + self.interval
+
+
 class Streamer(object):
 
     """ Simple streaming module to accept step-by-step procedures.
@@ -149,60 +872,303 @@ class Streamer(object):
     Step 3 is arbitrary function to accept one argument such as
     :func:`list.append()`.
 
+    If ``processes`` is given, procedures run on a process pool.
+    Set ``executor`` to choose the kind of pool, ``"process"``, ``"thread"``
+    for I/O bound procedures such as DNS or database lookup, or ``"serial"``
+    to run on current thread. Stats are reported in the same manner.
+    By default the pool is created and destroyed on each :meth:`consume`
+    call. To reuse one pool across many streams, call :meth:`open` and
+    :meth:`close` explicitly, or use the streamer as a context manager. ::
+
+        with Streamer(reporter, parse, processes=4) as s:
+            for fp in files:
+                s.consume(fp, source=fp.name)
+
+    In parallel mode, all procedures are fused into one :class:`Chain`
+    call in worker process by default. Set ``fused=False`` to submit each
+    procedure to the pool separately. Procedure marked by :func:`batched`
+    is submitted with whole batch on both modes.
+
+    Parallel mode collects results in completion order. Set ``ordered=True``
+    to collect them in input order. Since results following a slow item are
+    buffered until it completes, at most ``window`` items are submitted
+    ahead of collection. If ``window`` is not given, four batches for each
+    process are allowed.
+
+    Process pool reads input as fast as it can. To stop reading input until
+    workers catch up, give ``max_inflight`` as count of items and/or
+    ``max_inflight_bytes`` as size of items. Peak count and size of items
+    in flight are reported as ``inflight`` and ``inflight_bytes`` of stats.
+    These limits are applied on fused mode. Chunk size is clamped to
+    ``max_inflight`` (and ``window``), so that items in flight never exceed
+    it. Size limit is exceeded only by one batch of a huge item.
+
+    Progress is logged every ``reporting_seconds`` seconds with rate of
+    items and bytes. If it is ``0`` or ``None``, progress is logged every
+    :const:`clitool.PROCESSING_REPORTING_INTERVAL` items instead. Without
+    file descriptor of the source, bytes are counted only for text or
+    binary items.
+
+    Set ``instrument=True`` to report call count, cumulative time, latency
+    percentiles, skipped and error count for each procedure as
+    ``procedures`` of stats. See :class:`ProcedureProfile`.
+    Instrumentation is done on serial mode and fused mode, and refused on
+    unfused parallel mode by ``ValueError``.
+
+    If the first procedure is marked by :func:`bytes_aware`,
+    :class:`CliHandler` reads lines as ``bytes``.
+
     :param callback: function to collect parsed value
     :type callback: callable
     :param args: callables
     :type args: list
+    :param processes: number of processes or threads
+    :type processes: int
+    :param executor: kind of executor, either of :const:`clitool.EXECUTORS`
+        (default: "process" if ``processes`` is given, otherwise "serial")
+    :type executor: string
+    :param fused: run whole procedures at once in worker (default: True)
+    :type fused: bool
+    :param ordered: collect results in input order (default: False)
+    :type ordered: bool
+    :param window: maximum count of items in flight on ordered mode
+    :type window: int
+    :param max_inflight: maximum count of items in flight
+    :type max_inflight: int
+    :param max_inflight_bytes: maximum size of items in flight
+    :type max_inflight_bytes: int
+    :param reporting_seconds: interval to log progress
+        (default: :const:`clitool.PROCESSING_REPORTING_SECONDS`)
+    :type reporting_seconds: float
+    :param instrument: report timings of each procedure (default: False).
+        Parallel mode must be fused.
+    :type instrument: bool
+    :param batchsize: count of items given to procedure marked by
+        :func:`batched` if chunk size is not given (default: 1000)
+    :type batchsize: int
+    :param checkpoint: record processed position and resume from it.
+        Parallel mode is forced to be ordered, and must be fused.
+        See :class:`clitool.checkpoint.Checkpoint`.
+    :type checkpoint: Checkpoint
+    :param dead_letter: sink of skipped and errored items. Exceptions
+        raised by procedures are caught and reported as error. Parallel
+        mode must be fused. See :class:`clitool.deadletter.DeadLetter`.
+    :type dead_letter: DeadLetter
+    :param sample: rate of Bernoulli sampling in range of (0, 1]. The rate
+        is reported as ``sampling`` of stats to scale counts up.
+    :type sample: float
+    :param limit: process only first N items of each stream
+    :type limit: int
+    :param seed: seed of random sampling [optional]
+    :type seed: int
+    :param aggregate: aggregate results by forked callback in workers if
+        callback is mergeable, such as :class:`SimpleDictReporter`
+        (default: True). This is not done with checkpoint.
+    :type aggregate: bool
     """
 
     def __init__(self, callback=None, *args, **kwargs):
         procs = tuple(filter(lambda r: r, args))
         logging.debug("%d procedures are set.", len(procs))
         self.procedures = procs
+        self.chain = Chain(procs)
+        self.bytes_input = bool(procs) and \
+            getattr(procs[0], 'bytes_aware', False)
+        self.fused = kwargs.get('fused', True)
+        self.ordered = kwargs.get('ordered', False)
+        self.window = kwargs.get('window')
+        self.batchsize = kwargs.get('batchsize', 1000)
+        self.max_inflight = kwargs.get('max_inflight')
+        self.max_inflight_bytes = kwargs.get('max_inflight_bytes')
+        self.instrument = kwargs.get('instrument', False)
         self.collect = callback or (lambda r: r)
+        # Results are dropped without callback.
+        self.discard = callback is None
         self.processes = kwargs.get('processes')
-        if self.processes and self.processes > multiprocessing.cpu_count():
+        self.executor = kwargs.get('executor') or (
+            'process' if self.processes else 'serial')
+        if self.executor not in EXECUTORS:
+            raise ValueError('Unknown executor "{}"'.format(self.executor))
+        if self.executor == 'process' and self.processes and \
+                self.processes > multiprocessing.cpu_count():
                 logging.warn("given processes is %d, count of CPU is %d" % (
                     self.processes, multiprocessing.cpu_count()))
         self.reporting_interval = PROCESSING_REPORTING_INTERVAL
+        self.reporting_seconds = kwargs.get('reporting_seconds',
+                                            PROCESSING_REPORTING_SECONDS)
+        self.checkpoint = kwargs.get('checkpoint')
+        if self.checkpoint is not None and self.executor != 'serial':
+            if not self.fused:
+                raise ValueError('Checkpoint requires fused procedures')
+            # Position is exact only if results come in input order.
+            self.ordered = True
+        self.dead_letter = kwargs.get('dead_letter')
+        self.sample = kwargs.get('sample')
+        self.limit = kwargs.get('limit')
+        self.seed = kwargs.get('seed')
+        if self.sample is not None and not 0 < self.sample <= 1:
+            raise ValueError('Sampling rate must be in (0, 1]')
+        if self.checkpoint is not None and (self.sample or self.limit):
+            raise ValueError('Sampling can not be used with checkpoint')
+        # State of reporter on checkpoint must match position exactly.
+        self.aggregate = kwargs.get('aggregate', True) and \
+            self.checkpoint is None
+        if self.dead_letter is not None and self.executor != 'serial' and \
+                not self.fused:
+            raise ValueError('Dead letter requires fused procedures')
+        if self.instrument and self.executor != 'serial' and not self.fused:
+            raise ValueError('Instrument requires fused procedures')
+        # Profile is kept unreported in worker to be merged by parent.
+        self.raw_profile = False
+        self.pool = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def _create_pool(self):
+        logging.debug("Start %s pool: processes=%s", self.executor,
+            self.processes)
+        if self.executor == 'thread':
+            return multiprocessing.pool.ThreadPool(processes=self.processes)
+        return multiprocessing.Pool(processes=self.processes)
+
+    def open(self):
+        """ Start worker pool which is shared by following :meth:`consume`
+        calls. Nothing is done on serial executor.
+
+        :rtype: Streamer
+        """
+        if self.executor != 'serial' and self.pool is None:
+            self.pool = self._create_pool()
+        return self
+
+    def close(self):
+        """ Wait for workers to finish and shut down the pool.
+        """
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.close()
+            pool.join()
 
-    def consume(self, stream, source=None, chunksize=1):
+    def terminate(self):
+        """ Stop workers immediately without waiting for pending tasks.
+        """
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.terminate()
+            pool.join()
+
+    def consume(self, stream, source=None, chunksize=1, fileno=None,
+                sampling=None):
         """ Consuming given strem object and returns processing stats.
 
         :param stream: streaming object to consume
         :type stream: iterable
         :param source: source of stream to consume
         :type source: string
-        :param chunksize: chunk size for multiprocessing
-        :type chunksize: integer
+        :param chunksize: chunk size for multiprocessing. If ``"auto"``
+            is given, chunk size is tuned along with measured latency, and
+            chosen size is reported as ``chunksize`` of stats. Parallel
+            mode must be fused to tune it.
+        :type chunksize: integer or string
+        :param fileno: file descriptor of the source to report progress
+            by read position
+        :type fileno: int
+        :param sampling: rate of sampling already applied on the stream.
+            Bernoulli sampling of this streamer is not applied again.
+        :type sampling: float
         :rtype: dict
         """
-        stats = {
-            PROCESSING_TOTAL: 0,
-            PROCESSING_SKIPPED: 0,
-            PROCESSING_SUCCESS: 0,
-            PROCESSING_ERROR: 0
-        }
-        if source:
-            stats['source'] = source
+        if chunksize == 'auto' and self.executor != 'serial' and \
+                not self.fused:
+            raise ValueError('Auto chunk size requires fused procedures')
+        stats = self._new_stats(source)
+        stream = self._sampled(stream, stats, sampling)
+        checkpoint = self.checkpoint
+        resumed = checkpoint and checkpoint.start(source)
+        base = 0
+        if resumed:
+            if resumed['finished']:
+                logging.info('Skip "%s" finished on checkpoint.', source)
+                stats.update(resumed['stats'])
+                self._log_stats(stats)
+                return stats
+            stats.update(resumed['stats'])
+            base = stats.pop(PROCESSING_TIME)
+        offset = None
+        if checkpoint is not None:
+            # Byte offset is exact only if items are read one by one.
+            exact = self.executor == 'serial' and not (
+                self.chain.batched or self.instrument)
+            if exact:
+                offset = [resumed['offset'] if resumed else 0]
+            stream = _resume(stream, resumed, offset)
+        progress = None
+        if self.reporting_seconds:
+            progress = _Progress(self.reporting_seconds, fileno)
+            if progress.fileno is None:
+                stream = progress.count(stream)
+
+        dead_letter = self.dead_letter
 
         def skip_unless(r):
             if r:
                 return r
+            if dead_letter is not None:
+                dead_letter.write([(r, 'input', 'skipped', None)], source)
             stats[PROCESSING_SKIPPED] += 1
             stats[PROCESSING_TOTAL] += 1
 
+        shared = self.pool is not None
+        if self.executor != 'serial' and not shared:
+            pool = self._create_pool()
+        else:
+            pool = self.pool
+        if self.chain.batched and chunksize in (None, 1):
+            chunksize = self.batchsize
+        dispatch = None
         rs = ifilter(skip_unless, stream)
-        if self.processes:
-            pool = multiprocessing.Pool(processes=self.processes)
+        if pool is not None and self.fused:
+            if self.procedures:
+                # Falsy input is skipped by chain in worker.
+                dispatch = self._dispatch(pool, stream, chunksize, stats)
+                rs = dispatch
+        elif pool is not None:
+            imap_ = pool.imap if self.ordered else pool.imap_unordered
             for f in self.procedures:
-                rs = pool.imap_unordered(f, ifilter(skip_unless, rs),
-                        chunksize=chunksize)
+                stage = Chain((f, ))
+                if stage.batched:
+                    # Results of each batch are flattened.
+                    rs = itertools.chain.from_iterable(imap_(
+                        _StageBatch(stage),
+                        _batches(ifilter(skip_unless, rs), chunksize)))
+                else:
+                    rs = imap_(stage, ifilter(skip_unless, rs),
+                            chunksize=chunksize or 1)
+        elif self.chain.batched or self.instrument or dead_letter is not None:
+            size = self.batchsize if chunksize == 'auto' else chunksize or 1
+            if self.instrument:
+                profile = ProcedureProfile(self.chain.names())
+                stats[PROCESSING_PROCEDURES] = profile
+            else:
+                profile = None
+            if dead_letter is not None:
+                rs = self._rejecting(_batches(rs, size), profile, source)
+            else:
+                rs = (r for b in _batches(rs, size)
+                      for r in self.chain.batch(b, profile))
         else:
             for f in self.procedures:
                 rs = imap(f, ifilter(skip_unless, rs))
         start = time.time()
         i = 0
+        failed = completed = False
         try:
             while 1:
                 processed = next(rs)
@@ -212,51 +1178,573 @@ class Streamer(object):
                     stats[PROCESSING_ERROR] += 1
                 else:
                     stats[PROCESSING_SUCCESS] += 1
-                    self.collect(processed)
+                    if processed is not _MERGED:
+                        self.collect(processed)
                 i += 1
                 stats[PROCESSING_TOTAL] += 1
-                if i % self.reporting_interval == 0:
+                if checkpoint is not None and time.time() >= checkpoint.due:
+                    stats[PROCESSING_TIME] = base + time.time() - start
+                    checkpoint.update(source, stats, offset and offset[0])
+                if progress is not None:
+                    if i >= progress.next_check:
+                        progress.check(i)
+                elif i % self.reporting_interval == 0:
                     logging.info(" ===> Processed %dth item <=== ", i)
         except StopIteration:
-            pass
+            completed = True
         except KeyboardInterrupt:
             logging.info("Stopped by user interruption at %dth item.", i)
+            if dispatch is not None:
+                # Release task handler of pool waiting on throttle, or
+                # terminating pool waits for it forever.
+                dispatch.close()
+            if shared:
+                self.terminate()
+            elif pool is not None:
+                pool.terminate()
+                pool.join()
+            pool = None
             raise
-        except:
+        except Exception:
             e = sys.exc_info()[1]
             logging.error(e)
-            raise
+            failed = True
         finally:
-            if self.processes:
-                pool.close()
-                pool.join()
-            stats[PROCESSING_TIME] = time.time() - start
-            logging.info(
-                'STATS: total=%d, skipped=%d, success=%d, error=%d on %f[sec]'
-                ' from "%s"',
-                stats[PROCESSING_TOTAL], stats[PROCESSING_SKIPPED],
-                stats[PROCESSING_SUCCESS], stats[PROCESSING_ERROR],
-                stats[PROCESSING_TIME], stats.get('source', 'unknown'))
-            return stats
+            if dispatch is not None:
+                dispatch.close()
+            if dead_letter is not None:
+                dead_letter.flush()
+            if pool is not None:
+                if shared and failed:
+                    # Pending tasks of broken stream must not leak into
+                    # next stream, so recycle shared pool.
+                    self.terminate()
+                    self.open()
+                elif not shared:
+                    pool.close()
+                    pool.join()
+            stats[PROCESSING_TIME] = base + time.time() - start
+            if checkpoint is not None and completed:
+                checkpoint.finish(source, stats, offset and offset[0])
+            if PROCESSING_PROCEDURES in stats and not self.raw_profile:
+                stats[PROCESSING_PROCEDURES] = \
+                    stats[PROCESSING_PROCEDURES].report()
+            self._log_stats(stats)
+        return stats
+
+    def _sampled(self, stream, stats, sampling=None):
+        """ Apply sampling and limit on stream, and report the rate.
+        """
+        if sampling is None and self.sample and self.sample < 1:
+            sampling = self.sample
+            stream = _bernoulli(stream, sampling, random.Random(self.seed))
+        if sampling is not None and sampling < 1:
+            stats[PROCESSING_SAMPLING] = sampling
+        if self.limit:
+            stream = itertools.islice(stream, self.limit)
+        return stream
+
+    def _forked(self):
+        """ Fork of callback to aggregate in worker, if it is mergeable.
+        """
+        if self.aggregate and _mergeable(self.collect):
+            return self.collect.fork()
+
+    def _serial_copy(self):
+        """ Copy of this streamer without pool and callback to run in
+        worker of :class:`CliHandler`.
+        """
+        s = copy.copy(self)
+        s.pool = None
+        s.processes = None
+        s.executor = 'serial'
+        s.collect = None
+        s.checkpoint = None
+        s.dead_letter = None
+        s.raw_profile = True
+        return s
+
+    def _rejecting(self, batches, profile, source):
+        """ Apply chain on each batch and write rejected items.
+        """
+        for items in batches:
+            rejects = []
+            results = self.chain.batch(items, profile, rejects)
+            if rejects:
+                self.dead_letter.write(
+                    _rejected(self.chain, items, results, rejects), source)
+            for r in results:
+                yield r
+
+    def _new_stats(self, source=None):
+        stats = {
+            PROCESSING_TOTAL: 0,
+            PROCESSING_SKIPPED: 0,
+            PROCESSING_SUCCESS: 0,
+            PROCESSING_ERROR: 0
+        }
+        if source:
+            stats['source'] = source
+        return stats
+
+    def _log_stats(self, stats):
+        logging.info(
+            'STATS: total=%d, skipped=%d, success=%d, error=%d on %f[sec]'
+            ' from "%s"',
+            stats[PROCESSING_TOTAL], stats[PROCESSING_SKIPPED],
+            stats[PROCESSING_SUCCESS], stats[PROCESSING_ERROR],
+            stats[PROCESSING_TIME], stats.get('source', 'unknown'))
+
+    def _dispatch(self, pool, stream, chunksize, stats):
+        """ Submit batches of stream to pool and yield each result.
+        """
+        workers = self.processes or multiprocessing.cpu_count()
+        limits = [None, self.max_inflight, self.max_inflight_bytes]
+        if self.ordered:
+            if self.window:
+                limits[1] = min(self.window, limits[1] or self.window)
+            else:
+                limits[0] = 4 * workers
+        tuner = None
+        if chunksize == 'auto':
+            tuner = _ChunkTuner()
+            # Feedback of tuner is useless if whole input is submitted.
+            if not limits[0] and not limits[1]:
+                limits[0] = 2 * workers
+        throttle = _Throttle(*limits) if any(limits) else None
+        maxbytes = self.max_inflight_bytes
+        # Batch larger than limit of items would be admitted by throttle
+        # while nothing is in flight.
+        maxitems = limits[1]
+        size = chunksize or 1
+
+        def batches():
+            batch = []
+            nbytes = 0
+            for item in stream:
+                batch.append(item)
+                if maxbytes:
+                    nbytes += _sizeof(item)
+                target = tuner.size if tuner else size
+                if maxitems and target > maxitems:
+                    target = maxitems
+                full = len(batch) >= target
+                if not full and not (maxbytes and nbytes >= maxbytes):
+                    continue
+                if throttle and not throttle.acquire(len(batch), nbytes):
+                    return
+                yield time.time(), nbytes, batch
+                batch = []
+                nbytes = 0
+            if batch and (throttle is None or
+                          throttle.acquire(len(batch), nbytes)):
+                yield time.time(), nbytes, batch
+
+        dead_letter = self.dead_letter
+        reporter = self._forked()
+        task = _BatchTask(self.chain, self.instrument, dead_letter is not None,
+                          reporter)
+        if self.instrument:
+            profile = ProcedureProfile(self.chain.names())
+            stats[PROCESSING_PROCEDURES] = profile
+        imap_ = pool.imap if self.ordered else pool.imap_unordered
+        try:
+            for outcome in imap_(task, batches()):
+                if throttle:
+                    throttle.release(len(outcome.results), outcome.nbytes)
+                if tuner:
+                    tuner.update(outcome)
+                if outcome.profile is not None:
+                    profile.merge(outcome.profile)
+                if outcome.rejects:
+                    dead_letter.write(outcome.rejects, stats.get('source'))
+                if outcome.state is not None:
+                    self.collect.merge(outcome.state)
+                    for r in outcome.results:
+                        yield r if r is None or r is False else _MERGED
+                    continue
+                for r in outcome.results:
+                    yield r
+        finally:
+            if throttle:
+                throttle.close()
+                stats[PROCESSING_INFLIGHT] = throttle.peak[1]
+                if maxbytes:
+                    stats[PROCESSING_INFLIGHT_BYTES] = throttle.peak[2]
+            if tuner:
+                stats[PROCESSING_CHUNKSIZE] = tuner.size
+
+
+def _bernoulli(stream, rate, rand):
+    """ Choose each item with probability of ``rate``.
+    Count of items to skip is drawn from geometric distribution, so random
+    number is generated only for chosen items.
+    """
+    log_q = math.log(1.0 - rate)
+    it = iter(stream)
+    while 1:
+        gap = int(math.log(1.0 - rand.random()) / log_q)
+        for item in itertools.islice(it, gap, gap + 1):
+            yield item
+            break
+        else:
+            return
+
+
+def _sample_blocks(fp, encoding, size, block, count, rand):
+    """ Read lines of ``count`` blocks randomly chosen from seekable binary
+    file. Line belongs to the block where it starts. Lines are not decoded
+    if ``encoding`` is ``None``.
+    """
+    slots = max(1, size // block)
+    for index in sorted(rand.sample(range(slots), count)):
+        start = index * block
+        end = size if index == slots - 1 else start + block
+        if start > 0:
+            fp.seek(start - 1)
+            fp.readline()
+        else:
+            fp.seek(0)
+        while fp.tell() < end:
+            line = fp.readline()
+            if not line:
+                break
+            yield line.decode(encoding) if encoding else line
+
+
+class _Closing(object):
+    """ Iterable over lines of file, which closes the file by :meth:`close`.
+    """
+
+    def __init__(self, stream, fp):
+        self.stream = stream
+        self.fp = fp
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        self.fp.close()
+
+
+def _count_offset(stream, offset):
+    for item in stream:
+        if offset[0] is not None:
+            if isinstance(item, (six.binary_type, memoryview)):
+                offset[0] += len(item)
+            else:
+                offset[0] = None
+        yield item
+
+
+def _resume(stream, resumed, offset=None):
+    """ Skip items consumed on previous run. If ``offset`` is given as one
+    element list, byte offset of consumed items is counted on it.
+    """
+    skip = resumed['position'] if resumed else 0
+    if skip and resumed['offset'] and offset is not None and \
+            hasattr(stream, 'seek'):
+        logging.info('Seek to %d byte on checkpoint.', resumed['offset'])
+        stream.seek(resumed['offset'])
+        skip = 0
+    elif offset is not None:
+        offset[0] = 0
+    if offset is not None:
+        stream = _count_offset(stream, offset)
+    if skip:
+        logging.info('Skip %d items consumed on checkpoint.', skip)
+        stream = itertools.islice(stream, skip, None)
+    return stream
+
+
+def _fileno(*streams):
+    """ File descriptor of the first stream which has it.
+    For gzip file, descriptor of compressed file is chosen.
+    """
+    for stream in streams:
+        f = getattr(stream, 'fileobj', None) or stream
+        try:
+            return f.fileno()
+        except (AttributeError, ValueError, IOError, OSError):
+            pass
+
+
+def _count_byte(mm, start, end, char, bufsize=16 * 1024 * 1024):
+    count = 0
+    for pos in range(start, end, bufsize):
+        count += mm[pos:min(pos + bufsize, end)].count(char)
+    return count
+
+
+def split_ranges(name, count, quoted=False):
+    """ Split file into byte ranges aligned to newlines.
+    If ``quoted`` is True, newline in quoted field of CSV is not chosen as
+    boundary, counting quote characters from the beginning of the file.
+
+    :param name: file name
+    :type name: string
+    :param count: count of ranges at most
+    :type count: int
+    :param quoted: respect quoted newlines
+    :type quoted: bool
+    :rtype: list of tuple (start, end)
+    """
+    size = os.path.getsize(name)
+    if size == 0:
+        return [(0, 0)]
+    bounds = [0]
+    with open(name, 'rb') as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            quotes = pos = 0
+            for i in range(1, count):
+                n = mm.find(b'\n', max(size * i // count, bounds[-1]))
+                while quoted and n != -1:
+                    quotes += _count_byte(mm, pos, n, b'"')
+                    pos = n
+                    if quotes % 2 == 0:
+                        break
+                    n = mm.find(b'\n', n + 1)
+                if n == -1 or n + 1 >= size:
+                    break
+                bounds.append(n + 1)
+        finally:
+            mm.close()
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _first_record_end(name):
+    """ Byte offset of the end of first record of CSV file, where newline
+    in quoted field is not the end.
+    """
+    end = quotes = 0
+    with open(name, 'rb') as fp:
+        for line in fp:
+            end += len(line)
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                break
+    return end
+
+
+class _RejectBuffer(list):
+    """ Dead-letter sink in worker of :class:`CliHandler` to send rejected
+    items back to parent process.
+    """
+
+    def write(self, records, source=None):
+        self.append((records, source))
+
+    def flush(self):
+        pass
+
+
+def _discard(result):
+    pass
+
+
+class _FileTask(object):
+    """ Worker side of :class:`CliHandler` to consume whole file or a byte
+    range of file. Partial state of reporter and rejected items are returned
+    to parent process along with stats. Results are dropped if reporter is
+    not given. If the end of first record of CSV file is given along with a
+    range, procedures are primed with the record, such as header, before
+    the range.
+    """
+
+    def __init__(self, handler, delimiter, streamer, encoding, chunksize,
+                 reject=False, reporter=None, prefetch=False, mmap=False):
+        self.handler = handler
+        self.prefetch = prefetch
+        self.mmap = mmap
+        self.delimiter = delimiter
+        self.streamer = streamer
+        self.encoding = encoding
+        self.chunksize = chunksize
+        self.reject = reject
+        self.reporter = reporter
+
+    def __call__(self, args):
+        index, name, start, end, head = args
+        streamer = copy.copy(self.streamer)
+        if self.reporter is not None:
+            # Partial state of reporter is returned instead of results.
+            results = self.reporter.fork()
+            streamer.collect = results
+        else:
+            results = None
+            streamer.collect = _discard
+        if self.reject:
+            streamer.dead_letter = _RejectBuffer()
+        handler = self.handler(streamer, self.delimiter)
+        handler.prefetch = self.prefetch
+        handler.mmap = self.mmap
+        if start is not None:
+            parsed = self._consume_range(handler, name, start, end, head)
+            return index, parsed, self._state(results), streamer.dead_letter
+        with open(name) as fp:
+            stream = handler.reader(fp, self.encoding)
+            try:
+                parsed = streamer.consume(stream, source=name,
+                    chunksize=self.chunksize, fileno=_fileno(stream, fp))
+            finally:
+                if stream is not fp and hasattr(stream, 'close'):
+                    stream.close()
+        return index, parsed, self._state(results), streamer.dead_letter
+
+    def _state(self, results):
+        if self.reporter is not None:
+            return results.state()
+
+    def _consume_range(self, handler, name, start, end, head=None):
+        source = '%s[%d:%d]' % (name, start, end)
+        if start == end:
+            return handler.streamer.consume((), source=source)
+        if handler._bytes_mode(os.path.splitext(name)[1]):
+            encoding = None
+        else:
+            encoding = self.encoding
+        with open(name, 'rb') as fp:
+            if head:
+                self._prime(handler, fp, name, head, encoding)
+            lines = MappedLines(fp, start, end, view=self.mmap,
+                                encoding=encoding)
+            try:
+                stream = handler.range_reader(lines, name, self.encoding)
+                return handler.streamer.consume(stream, source=source,
+                    chunksize=self.chunksize)
+            finally:
+                lines.close()
+
+    def _prime(self, handler, fp, name, head, encoding):
+        """ Apply procedures on the first record of file, as on the
+        beginning of the file. Its results are discarded and not counted.
+        """
+        lines = MappedLines(fp, 0, head, encoding=encoding)
+        try:
+            rows = list(handler.range_reader(lines, name, self.encoding))
+        finally:
+            lines.close()
+        handler.streamer.chain.batch(rows, None, [])
+
+
+def _merge_stats(stats, other):
+    """ Merge stats of a byte range into stats of the file. Counts are
+    summed up, and profiles of procedures are merged. Other keys, such as
+    ``sampling`` which is same on all ranges, are kept from the first one.
+    """
+    for k in (PROCESSING_TOTAL, PROCESSING_SKIPPED, PROCESSING_SUCCESS,
+              PROCESSING_ERROR):
+        stats[k] += other[k]
+    stats[PROCESSING_TIME] = max(stats[PROCESSING_TIME],
+                                 other[PROCESSING_TIME])
+    profile = other.get(PROCESSING_PROCEDURES)
+    if profile is not None and PROCESSING_PROCEDURES in stats:
+        stats[PROCESSING_PROCEDURES].merge(profile)
+    for k, v in other.items():
+        stats.setdefault(k, v)
+
+
+def _ascii_compatible(encoding):
+    """ Whether newline and quote are encoded as ASCII, except byte order
+    mark on the beginning.
+    """
+    encoder = codecs.getincrementalencoder(encoding)()
+    encoder.encode(six.text_type('-'))
+    return all(encoder.encode(c) == c.encode('ascii')
+               for c in six.text_type('\n"'))
 
 
 class CliHandler(object):
 
     """ Simple command line arguments handler.
 
+    If ``partition`` is ``"file"`` and streamer has worker pool, each file
+    is opened, parsed and collected by one worker. Stats are returned in the
+    order of given files. Callback of streamer must be mergeable, such as
+    :class:`SimpleDictReporter`, so that only its partial state is sent
+    back and merged in parent process, or not given at all. Otherwise
+    results of whole file would be kept in memory of worker, so partition
+    is ignored with warning and items are sent to workers in batches.
+
+    If ``partition`` is ``"range"``, uncompressed text files are split into
+    byte ranges aligned to newlines by :func:`split_ranges`, and each
+    worker reads its range via ``mmap``. Stats of ranges are merged for each
+    file. For CSV and TSV files, newlines in quoted fields are respected.
+    Since boundaries are found on bytes, encoding which does not encode
+    newline and quote as ASCII, such as UTF-16, is refused by
+    ``ValueError``. Compressed and JSON files are handled by one worker for
+    each file. Since header row of CSV and TSV files is in the first range,
+    procedures of other ranges, such as :class:`RowMapper`, are given the
+    first record before rows of the range, and its results are discarded.
+    Partition is not used if streamer has checkpoint.
+
+    If streamer has ``sample`` rate, blocks of ``sample_block`` bytes at
+    random offsets are read from each plain text file, so the rest of the
+    file is never read. The ratio of read blocks is reported as
+    ``sampling`` of stats. Other files are sampled by :class:`Streamer`.
+
+    If ``follow`` is true, lines appended to one input file are consumed
+    by :class:`clitool.follow.Follower` until interrupted, with rotation
+    handling. Its read offset is saved into ``follow_offset`` file to
+    resume. Since worker pool reads input ahead of processed items, and
+    saved offset would include lines never processed, follow mode requires
+    "serial" executor and refuses others by ``ValueError``.
+
     :param streamer: streaming object
     :type streamer: Streamer
     :param delimiter: column delimiter such as "\t"
     :type delimiter: string
+    :param partition: unit of work to distribute to workers, either of
+        :const:`clitool.PARTITIONS`
+    :type partition: string
+    :param prefetch: decompress compressed files on another thread
+    :type prefetch: bool
+    :param mmap: map plain files to memory by
+        :class:`clitool.textio.MappedLines`
+    :type mmap: bool
+    :param follow: follow appended lines of input file
+    :type follow: bool
+    :param follow_offset: path of file to save offset on follow mode.
+        Follow mode is enabled if it is given. [optional]
+    :type follow_offset: string
     """
 
-    def __init__(self, streamer, delimiter=None):
+    # minimum size of byte range on "range" partition
+    range_size = 1024 * 1024
+    # size of block read at random offset on sampling
+    sample_block = 64 * 1024
+
+    def __init__(self, streamer, delimiter=None, partition=None,
+                 prefetch=False, mmap=False, follow=False,
+                 follow_offset=None):
         self.streamer = streamer
         self.delimiter = delimiter
+        if partition and partition not in PARTITIONS:
+            raise ValueError('Unknown partition "{}"'.format(partition))
+        self.partition = partition
+        self.prefetch = prefetch
+        self.mmap = mmap
+        self.follow = follow or bool(follow_offset)
+        self.follow_offset = follow_offset
 
     def reader(self, fp, encoding):
         """ Simple `open` wrapper for several file types.
-        This supports ``.gz`` and ``.json``.
+        This supports ``.json``, ``.jsonl``, ``.ndjson``, ``.csv``, ``.tsv``,
+        and compressed files listed on :const:`clitool.compress.CODECS` with
+        chained suffix such as ``.csv.gz``. Compressed file without known
+        content suffix is read as lines of bytes.
+
+        Elements of top-level array of ``.json`` are parsed one by one, and
+        each line of ``.jsonl`` and ``.ndjson`` is parsed as JSON.
+        If the first procedure is marked by :func:`bytes_aware`, other files
+        are read as lines of bytes by :func:`clitool.textio.byte_lines`.
+        On ``mmap`` mode, they are mapped by
+        :class:`clitool.textio.MappedLines` instead.
 
         :param fp: opened file
         :type fp: file pointer
@@ -264,20 +1752,76 @@ class CliHandler(object):
         :type encoding: string
         :rtype: file pointer
         """
-        _, suffix = os.path.splitext(fp.name)
-        if suffix == '.gz':
+        codec, suffix = split_suffix(fp.name)
+        plain = not (suffix in _TEXT_SUFFIXES or self.delimiter)
+        binary = None
+        if codec:
             fp.close()
-            return gzip.open(fp.name)
-        elif suffix == '.json':
-            return json.load(fp)
+            binary = open_compressed(fp.name, codec, prefetch=self.prefetch)
+            if plain:
+                return binary
+            fp = io.TextIOWrapper(binary, encoding) if PY3 else binary
+        elif plain:
+            if self.mmap:
+                lines = self._mapped_reader(fp, encoding)
+                if lines is not None:
+                    return lines
+            if self.streamer.bytes_input:
+                return self._byte_reader(fp)
+        if suffix == '.json':
+            stream = json_array(fp)
+        elif suffix in _JSON_LINES:
+            stream = json_lines(fp)
         elif suffix == '.csv' or self.delimiter:
-            return csvreader(fp, encoding, delimiter=self.delimiter or ',')
+            stream = csvreader(fp, encoding, delimiter=self.delimiter or ',')
         elif suffix == '.tsv':
-            return csvreader(fp, encoding, delimiter='\t')
-        return fp
+            stream = csvreader(fp, encoding, delimiter='\t')
+        else:
+            return fp
+        # Text wrapper is kept to be closed along with the stream.
+        return stream if binary is None else _Closing(stream, fp)
+
+    def _bytes_mode(self, suffix):
+        """ Whether lines of file of given suffix are given as bytes.
+        """
+        return self.streamer.bytes_input and not (
+            suffix in _TEXT_SUFFIXES or self.delimiter)
+
+    def _mapped_reader(self, fp, encoding):
+        """ Lines of opened plain file mapped to memory, or ``None`` if it
+        can not be mapped. Lines are given as :class:`memoryview` to
+        bytes-aware procedure, but as bytes to process pool since it can
+        not be pickled.
+        """
+        bytes_mode = self.streamer.bytes_input
+        try:
+            lines = MappedLines(fp,
+                view=bytes_mode and self.streamer.executor != 'process',
+                encoding=None if bytes_mode else encoding)
+        except (ValueError, EnvironmentError):
+            logging.info('"%s" can not be mapped, read as usual.', fp.name)
+            return
+        # Mapping is kept after file is closed. Progress is counted on
+        # lines since read position of file does not move.
+        fp.close()
+        return lines
+
+    def _byte_reader(self, fp):
+        """ Lines of bytes of opened text file. Regular file is opened again
+        without buffering to read it through large buffer.
+        """
+        if os.path.isfile(fp.name):
+            fp.close()
+            return byte_lines(io.open(fp.name, 'rb', 0))
+        buf = getattr(fp, 'buffer', None)
+        if buf is None:
+            return fp
+        return _Closing(byte_lines(buf), fp)
 
     def handle(self, files, encoding, chunksize=1):
         """ Handle given files with given encoding.
+        Worker pool of streamer is started once and shared by all files,
+        unless it is already opened by caller, and then it is left open.
 
         :param files: opened files.
         :type files: list
@@ -288,23 +1832,180 @@ class CliHandler(object):
         :rtype: list
         """
         stats = []
-        if files:
+        partition = self.partition
+        streamer = self.streamer
+        if partition and streamer.checkpoint is not None:
+            logging.warn("Partition is ignored on checkpoint.")
+            partition = None
+        elif partition and not streamer.discard and not (
+                streamer.aggregate and _mergeable(streamer.collect)):
+            logging.warn("Partition is ignored, since callback is not "
+                "mergeable.")
+            partition = None
+        if self.follow:
+            if not files or len(files) != 1:
+                raise ValueError('Follow mode requires one input file')
+            if self.streamer.executor != 'serial':
+                raise ValueError('Follow mode requires serial executor')
+            with self.streamer:
+                stats.append(self._follow(files[0], encoding, chunksize))
+            return stats
+        if streamer.pool is not None:
+            # Pool opened by caller is left open for following calls.
+            return self._handle(files, encoding, chunksize, partition)
+        with streamer:
+            return self._handle(files, encoding, chunksize, partition)
+
+    def _handle(self, files, encoding, chunksize, partition):
+        stats = []
+        if files and partition and self.streamer.pool is not None:
+            logging.info("Input file count: %d", len(files))
+            stats = self._handle_files(files, encoding, chunksize)
+        elif files:
             logging.info("Input file count: %d", len(files))
             for fp in files:
-                stream = self.reader(fp, encoding)
+                sampled = self._sample_reader(fp, encoding)
+                if sampled:
+                    stream, rate = sampled
+                else:
+                    stream, rate = self.reader(fp, encoding), None
                 parsed = self.streamer.consume(stream,
-                    source=fp.name, chunksize=chunksize)
+                    source=fp.name, chunksize=chunksize,
+                    fileno=_fileno(stream, fp), sampling=rate)
                 stats.append(parsed)
+                if stream is not fp and hasattr(stream, 'close'):
+                    stream.close()
                 if not fp.closed:
                     fp.close()
         else:
             stream = sys.stdin
             if self.delimiter:
-                stream = csvreader(stream, encoding, delimiter=self.delimiter)
-            parsed = self.streamer.consume(stream, chunksize=chunksize)
+                stream = csvreader(stream, encoding,
+                    delimiter=self.delimiter)
+            elif self.streamer.bytes_input and \
+                    getattr(stream, 'buffer', None) is not None:
+                stream = byte_lines(stream.buffer)
+            parsed = self.streamer.consume(stream, chunksize=chunksize,
+                fileno=_fileno(sys.stdin))
             stats.append(parsed)
         return stats
 
+    def _follow(self, fp, encoding, chunksize):
+        """ Consume lines appended to given file until interrupted.
+        """
+        name = fp.name
+        codec, suffix = split_suffix(name)
+        if codec or suffix == '.json':
+            raise ValueError('Can not follow "%s"' % (name, ))
+        fp.close()
+        follower = Follower(name, offset=self.follow_offset,
+            encoding=None if self._bytes_mode(suffix) else encoding)
+        try:
+            stream = self.range_reader(follower, name, encoding)
+            return self.streamer.consume(stream, source=name,
+                chunksize=chunksize)
+        finally:
+            follower.close()
+
+    def _sample_reader(self, fp, encoding):
+        """ Sample blocks of plain text file at random offsets.
+        """
+        rate = self.streamer.sample
+        if not rate or rate >= 1 or self.delimiter:
+            return
+        codec, suffix = split_suffix(fp.name)
+        if codec or suffix in ('.json', '.csv', '.tsv'):
+            return
+        try:
+            st = os.fstat(fp.fileno())
+        except (AttributeError, OSError, ValueError):
+            return
+        if not stat.S_ISREG(st.st_mode) or st.st_size < 2 * self.sample_block:
+            return
+        fp.close()
+        binary = open(fp.name, 'rb')
+        slots = st.st_size // self.sample_block
+        count = min(slots, int(math.ceil(slots * rate)))
+        if self._bytes_mode(suffix):
+            encoding = None
+        stream = _sample_blocks(binary, encoding, st.st_size,
+            self.sample_block, count, random.Random(self.streamer.seed))
+        if suffix in _JSON_LINES:
+            stream = json_lines(stream)
+        return _Closing(stream, binary), count / float(slots)
+
+    def range_reader(self, lines, name, encoding):
+        """ Wrap decoded lines of a byte range along with file type.
+
+        :param lines: decoded lines
+        :type lines: iterable
+        :param name: file name
+        :type name: string
+        :param encoding: encoding of the file
+        :type encoding: string
+        :rtype: iterable
+        """
+        _, suffix = os.path.splitext(name)
+        if suffix == '.csv' or self.delimiter:
+            return csvreader(lines, encoding, delimiter=self.delimiter or ',')
+        elif suffix == '.tsv':
+            return csvreader(lines, encoding, delimiter='\t')
+        elif suffix in _JSON_LINES:
+            return json_lines(lines)
+        return lines
+
+    def _tasks(self, names, encoding):
+        workers = self.streamer.processes or multiprocessing.cpu_count()
+        for index, name in enumerate(names):
+            codec, suffix = split_suffix(name)
+            if self.partition != 'range' or codec or suffix == '.json':
+                yield index, name, None, None, None
+                continue
+            if not _ascii_compatible(encoding):
+                raise ValueError('Can not split "%s" encoded by %s' % (
+                    name, encoding))
+            quoted = bool(suffix in ('.csv', '.tsv') or self.delimiter)
+            count = max(1, min(workers * 4,
+                               os.path.getsize(name) // self.range_size))
+            # Header row of the first range is given to other ranges.
+            head = _first_record_end(name) if quoted else None
+            for start, end in split_ranges(name, count, quoted):
+                yield index, name, start, end, head if start else None
+
+    def _handle_files(self, files, encoding, chunksize):
+        names = []
+        for fp in files:
+            names.append(fp.name)
+            if not fp.closed:
+                fp.close()
+        dead_letter = self.streamer.dead_letter
+        reporter = self.streamer._forked()
+        task = _FileTask(type(self), self.delimiter,
+                         self.streamer._serial_copy(), encoding, chunksize,
+                         dead_letter is not None, reporter, self.prefetch,
+                         self.mmap)
+        stats = [None] * len(names)
+        pool = self.streamer.pool
+        tasks = list(self._tasks(names, encoding))
+        for index, parsed, results, rejects in pool.imap_unordered(task,
+                                                                   tasks):
+            if reporter is not None:
+                self.streamer.collect.merge(results)
+            for records, source in rejects or ():
+                dead_letter.write(records, source)
+            if stats[index] is None:
+                parsed['source'] = names[index]
+                stats[index] = parsed
+            else:
+                _merge_stats(stats[index], parsed)
+        if dead_letter is not None:
+            dead_letter.flush()
+        for parsed in stats:
+            if PROCESSING_PROCEDURES in parsed:
+                parsed[PROCESSING_PROCEDURES] = \
+                    parsed[PROCESSING_PROCEDURES].report()
+        return stats
+
 
 class CsvHandler(CliHandler):
 
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Reporters for streamer API with bounded memory.
+
+:class:`clitool.processor.SimpleDictReporter` keeps exact count of every
+distinct value. :class:`HeavyHitterReporter` keeps fixed-size sketches of
+:mod:`clitool.sketch` instead. ::
+
+    reporter = HeavyHitterReporter(capacity=100, fields=('path', 'ua'))
+    clistream(reporter, parse, **kwargs)
+    for value, count, error in reporter.top('path', 10):
+        print(count, value)
+
+It is mergeable as well as :class:`~clitool.processor.SimpleDictReporter`.
+
+:class:`WindowReporter` aggregates records for each time window, and keeps
+only open windows. ::
+
+    reporter = WindowReporter(60, sink=print)
+    clistream(reporter, parse, **kwargs)
+    reporter.close()
+"""
+
+import copy
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from clitool.sketch import HyperLogLog, SpaceSaving
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class HeavyHitterReporter(object):
+    """ Report most frequent values and distinct count of each field.
+
+    For each field, a :class:`~clitool.sketch.SpaceSaving` sketch of
+    ``capacity`` items and a :class:`~clitool.sketch.HyperLogLog` of
+    ``2 ** precision`` registers are kept. Memory of each field is fixed,
+    up to ``2 * capacity`` values and ``2 ** precision`` bytes.
+    Count of value is overestimated by ``total / capacity`` at most, and
+    standard error of distinct count is ``1.04 / sqrt(2 ** precision)``.
+
+    Same as :class:`~clitool.processor.SimpleDictReporter`, string values
+    of dictionary are reported. Set ``fields`` to limit fields, otherwise
+    count of fields grows with distinct keys.
+
+    :param capacity: count of frequent values to keep for each field
+    :type capacity: int
+    :param precision: precision of distinct counter, 4 to 16
+    :type precision: int
+    :param fields: names of fields to report [optional]
+    :type fields: iterable
+    """
+
+    def __init__(self, capacity=1000, precision=12, fields=None):
+        self.capacity = capacity
+        self.precision = precision
+        self.fields = frozenset(fields) if fields else None
+        self.sketches = {}
+
+    def _sketch(self, field):
+        sketch = self.sketches.get(field)
+        if sketch is None:
+            sketch = (SpaceSaving(self.capacity), HyperLogLog(self.precision))
+            self.sketches[field] = sketch
+        return sketch
+
+    def __call__(self, entry):
+        """
+        :param entry: dictionary
+        :rtype: None
+        """
+        if type(entry) is not dict:
+            return
+        fields = self.fields
+        for k in entry:
+            v = entry[k]
+            if type(v) == str and (fields is None or k in fields):
+                top, distinct = self._sketch(k)
+                top.add(v)
+                distinct.add(v)
+
+    def top(self, field, k=None):
+        """ Most frequent values of given field.
+
+        :param field: name of field
+        :type field: string
+        :param k: count of values (default: capacity)
+        :type k: int
+        :rtype: list of tuple (value, count, error)
+        """
+        if field not in self.sketches:
+            return []
+        return self.sketches[field][0].top(k)
+
+    def distinct(self, field):
+        """ Estimated count of distinct values of given field.
+
+        :param field: name of field
+        :type field: string
+        :rtype: int
+        """
+        if field not in self.sketches:
+            return 0
+        return self.sketches[field][1].count()
+
+    def report(self):
+        """ Counts of frequent values in the same form as
+        :meth:`SimpleDictReporter.report`.
+
+        :rtype: dict
+        """
+        report = {}
+        for field, (top, _) in self.sketches.items():
+            for value, count, _ in top.top():
+                report[field + ":" + value] = count
+        return report
+
+    def fork(self):
+        """ Empty copy of this reporter to aggregate in worker.
+
+        :rtype: HeavyHitterReporter
+        """
+        reporter = copy.copy(self)
+        reporter.sketches = {}
+        return reporter
+
+    def state(self):
+        """ Picklable state to save on checkpoint or to merge.
+
+        :rtype: dict
+        """
+        return dict((field, (top.state(), distinct.state()))
+                    for field, (top, distinct) in self.sketches.items())
+
+    def merge(self, state):
+        """ Merge partial state of forked reporter.
+
+        :param state: state returned by :meth:`state`
+        :type state: dict
+        """
+        for field, (top, distinct) in state.items():
+            mine = self._sketch(field)
+            mine[0].merge(SpaceSaving.from_state(top, self.capacity))
+            mine[1].merge(HyperLogLog.from_state(distinct))
+
+    def restore(self, state):
+        """ Restore state saved by :meth:`state`.
+
+        :param state: saved state
+        :type state: dict
+        """
+        self.sketches = {}
+        self.merge(state)
+
+
+def _int_dict():
+    return defaultdict(int)
+
+
+class WindowReporter(object):
+    """ Aggregate records in fixed windows of event time.
+
+    Each record is bucketed by ``time_field``, either of :class:`datetime`
+    or seconds from epoch, into tumbling windows of ``size`` seconds, or
+    sliding windows of ``size`` seconds for every ``slide`` seconds.
+    For each window, count of records, count of each value of ``fields``
+    and sum of numeric values of ``sums`` are aggregated.
+
+    Records may come out of order by ``lateness`` seconds. Window is closed
+    when the latest event time minus ``lateness`` passes its end, and given
+    to ``sink`` in order of start time. Record of closed window is dropped
+    and counted as ``late``. Since only open windows are kept in memory,
+    this reporter runs on endless stream such as ``tail -f``. Call
+    :meth:`close` on the end of stream to flush open windows.
+
+    Window is given to ``sink`` as dict, for example::
+
+        {'start': datetime(2012, 10, 17, 19, 9), 'end': ...,
+         'count': 120, 'status': {200: 118, 404: 2}, 'size': 181201}
+
+    If ``sink`` is not given, closed windows are kept and returned by
+    :meth:`report`. This reporter is not mergeable, since windows are
+    closed along with order of records. Records are collected in parent
+    process of :class:`~clitool.processor.Streamer`.
+
+    :param size: seconds of window
+    :type size: int
+    :param slide: seconds between start of windows (default: ``size``)
+    :type slide: int
+    :param lateness: seconds of allowed delay of records (default: 0)
+    :type lateness: int
+    :param sink: callable to accept closed window [optional]
+    :type sink: callable
+    :param time_field: name of event time field (default: "time")
+    :type time_field: string
+    :param fields: names of fields to count values
+        (default: ``("status", )``)
+    :type fields: iterable
+    :param sums: names of fields to sum (default: ``("size", )``)
+    :type sums: iterable
+    """
+
+    def __init__(self, size=60, slide=None, lateness=0, sink=None,
+                 time_field='time', fields=('status', ), sums=('size', )):
+        slide = slide or size
+        if not 0 < slide <= size:
+            raise ValueError('Slide must be in range of (0, size]')
+        self.size = size
+        self.slide = slide
+        self.lateness = lateness
+        self.sink = sink
+        self.time_field = time_field
+        self.fields = tuple(fields)
+        self.sums = tuple(sums)
+        self.windows = {}
+        self.closed = []
+        self.latest = None
+        self.closed_until = None
+        self.next_close = None
+        self.late = 0
+        self.datetime = False
+
+    def __call__(self, entry):
+        """
+        :param entry: dictionary
+        :rtype: None
+        """
+        if type(entry) is not dict:
+            return
+        t = entry.get(self.time_field)
+        if t is None:
+            return
+        if isinstance(t, datetime):
+            self.datetime = True
+            t = (t - _EPOCH).total_seconds()
+        if self.latest is None or t > self.latest:
+            self.latest = t
+        start = math.floor(t / self.slide) * self.slide
+        accepted = False
+        while start > t - self.size:
+            end = start + self.size
+            if self.closed_until is None or end > self.closed_until:
+                self._add(start, end, entry)
+                accepted = True
+            start -= self.slide
+        if not accepted:
+            self.late += 1
+        watermark = self.latest - self.lateness
+        if self.next_close is not None and watermark >= self.next_close:
+            self._flush(watermark)
+
+    def _add(self, start, end, entry):
+        w = self.windows.get(start)
+        if w is None:
+            w = self.windows[start] = [0, defaultdict(_int_dict),
+                                       defaultdict(int)]
+            if self.next_close is None or end < self.next_close:
+                self.next_close = end
+        w[0] += 1
+        for k in self.fields:
+            if k in entry:
+                w[1][k][entry[k]] += 1
+        for k in self.sums:
+            v = entry.get(k)
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                w[2][k] += v
+
+    def _time(self, seconds):
+        if self.datetime:
+            return _EPOCH + timedelta(seconds=seconds)
+        return seconds
+
+    def _emit(self, start):
+        count, counts, sums = self.windows.pop(start)
+        window = {'start': self._time(start),
+                  'end': self._time(start + self.size),
+                  'count': count}
+        for k in self.fields:
+            window[k] = dict(counts.get(k, {}))
+        for k in self.sums:
+            window[k] = sums.get(k, 0)
+        if self.sink is None:
+            self.closed.append(window)
+        else:
+            self.sink(window)
+
+    def _flush(self, watermark):
+        for start in sorted(self.windows):
+            if start + self.size > watermark:
+                break
+            self._emit(start)
+        self.closed_until = watermark
+        if self.windows:
+            self.next_close = min(self.windows) + self.size
+        else:
+            self.next_close = None
+
+    def close(self):
+        """ Close all open windows and give them to sink.
+        """
+        for start in sorted(self.windows):
+            self._emit(start)
+        if self.latest is not None:
+            self.closed_until = self.latest
+        self.next_close = None
+
+    def report(self):
+        """ Closed windows kept without sink, and open windows.
+
+        :rtype: list
+        """
+        opened = WindowReporter(self.size, self.slide, 0, None,
+                                self.time_field, self.fields, self.sums)
+        opened.datetime = self.datetime
+        opened.windows = dict((k, copy.deepcopy(v))
+                              for k, v in self.windows.items())
+        opened.close()
+        return self.closed + opened.closed
+
+    def state(self):
+        """ Picklable state of open windows to save on checkpoint.
+
+        :rtype: dict
+        """
+        return {
+            'windows': self.windows,
+            'latest': self.latest,
+            'closed_until': self.closed_until,
+            'late': self.late,
+            'datetime': self.datetime
+        }
+
+    def restore(self, state):
+        """ Restore state saved by :meth:`state`.
+
+        :param state: saved state
+        :type state: dict
+        """
+        self.windows = state['windows']
+        self.latest = state['latest']
+        self.closed_until = state['closed_until']
+        self.late = state['late']
+        self.datetime = state['datetime']
+        if self.windows:
+            self.next_close = min(self.windows) + self.size
+        else:
+            self.next_close = None
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
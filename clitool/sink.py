@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Buffered output sinks of CSV, TSV, JSON Lines and LTSV.
+
+Sink is a callback of :class:`clitool.processor.Streamer` to write each
+record of dictionary. Fields are given as definitions of
+:class:`clitool.textio.DictMapper`, and values are converted by it except
+JSON Lines, which keeps types of values. ::
+
+    FIELDS = (
+        {'id': 'time', 'type': 'datetime', 'format': '%Y-%m-%dT%H:%M:%S'},
+        {'id': 'path', 'type': 'string'},
+        {'id': 'status', 'type': 'integer'}
+    )
+
+    with open_sink('csv', args.output, FIELDS, args.output_encoding) as sink:
+        clistream(sink, parse, **vars(args))
+
+Rows are kept as text up to ``batch`` rows, and joined and encoded at once
+into binary buffer of output. Output is a path or a file object, such as
+``--output`` of :func:`clitool.cli.base_parser`. Text file is written
+through its binary buffer in ``encoding`` (``--output-encoding``).
+
+Supported formats are listed on :const:`clitool.OUTPUT_FORMATS`.
+"""
+
+import csv
+import datetime
+import io
+import json
+
+import six
+from six import PY3
+
+from clitool import DEFAULT_ENCODING
+from clitool.textio import DictMapper
+
+# count of rows to encode and write at once
+SINK_BATCH_SIZE = 10000
+
+if PY3:
+    def _csv_text(rows, **kwargs):
+        buf = io.StringIO()
+        csv.writer(buf, **kwargs).writerows(rows)
+        return buf.getvalue()
+
+else:
+    def _csv_text(rows, **kwargs):
+        buf = io.BytesIO()
+        csv.writer(buf, **kwargs).writerows(
+            [[_text(v).encode('utf-8') for v in row] for row in rows])
+        return buf.getvalue().decode('utf-8')
+
+
+def _text(value):
+    if value is None:
+        return six.text_type()
+    if isinstance(value, six.text_type):
+        return value
+    if isinstance(value, bytes):
+        return value.decode(DEFAULT_ENCODING)
+    return six.text_type(value)
+
+
+class Sink(object):
+    """ Base class of sinks.
+    Subclass implements :meth:`format` to convert record into a row.
+
+    If ``fields`` is not given, "string" fields are taken from sorted keys
+    of the first record.
+
+    :param output: path or file to write
+    :type output: string or file
+    :param fields: field definitions of
+        :class:`~clitool.textio.DictMapper` [optional]
+    :type fields: list of dict
+    :param encoding: encoding of output (default: utf-8)
+    :type encoding: string
+    :param batch: count of rows to write at once
+    :type batch: int
+    :param header: write header row if the format has it
+    :type header: bool
+    """
+
+    def __init__(self, output, fields=None, encoding=DEFAULT_ENCODING,
+                 batch=SINK_BATCH_SIZE, header=True):
+        if isinstance(output, six.string_types):
+            self.fp = io.open(output, 'wb')
+            self.owned = True
+        else:
+            self.fp = output
+            self.owned = False
+        self.encoding = encoding or DEFAULT_ENCODING
+        self.batch = batch
+        self.header = header
+        self.fields = None
+        self.mapper = None
+        self.rows = []
+        self.count = 0
+        if fields:
+            self._set_fields(fields)
+
+    def _set_fields(self, fields):
+        self.fields = list(fields)
+        self.mapper = DictMapper(self.fields)
+        self.ids = [f['id'] for f in self.fields]
+        if self.header:
+            row = self.format_header(self.ids)
+            if row is not None:
+                self.rows.append(row)
+
+    def __call__(self, entry):
+        """
+        :param entry: dictionary
+        :rtype: None
+        """
+        if type(entry) is not dict:
+            return
+        if self.mapper is None:
+            self._set_fields({'id': k, 'type': 'string'}
+                             for k in sorted(entry))
+        self.rows.append(self.format(entry))
+        self.count += 1
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def format_header(self, ids):
+        """ Header row of given field names, or ``None`` if the format has
+        no header.
+        """
+        return None
+
+    def format(self, entry):
+        """ Text of a row, terminated by newline.
+
+        :param entry: record
+        :type entry: dict
+        :rtype: string
+        """
+        raise NotImplementedError
+
+    def text(self, rows):
+        """ Text of buffered rows.
+
+        :rtype: string
+        """
+        return ''.join(rows)
+
+    def flush(self):
+        """ Encode buffered rows at once and write them.
+        """
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        data = self.text(rows)
+        if isinstance(self.fp, io.TextIOBase):
+            binary = getattr(self.fp, 'buffer', None)
+            if binary is None:
+                self.fp.write(data)
+                return
+            # Keep order of text written to the file before.
+            self.fp.flush()
+            binary.write(data.encode(self.encoding))
+        else:
+            self.fp.write(data.encode(self.encoding))
+
+    def close(self):
+        """ Write buffered rows, and close output if it is opened by path.
+        """
+        self.flush()
+        if self.owned:
+            self.fp.close()
+        else:
+            self.fp.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvSink(Sink):
+    """ Comma separated values with header row.
+    Rows are quoted by :mod:`csv` module.
+    """
+
+    delimiter = ','
+
+    def format_header(self, ids):
+        return ids
+
+    def format(self, entry):
+        return self.mapper(entry)
+
+    def text(self, rows):
+        return _csv_text(rows, delimiter=self.delimiter,
+                         lineterminator='\n')
+
+
+class TsvSink(CsvSink):
+    """ Tab separated values with header row.
+    Values including tab, newline or quote are quoted same as CSV, so that
+    :class:`~clitool.processor.CliHandler` reads them back.
+    """
+
+    delimiter = '\t'
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return _text(value)
+
+
+class JsonLinesSink(Sink):
+    """ JSON object of each record on a line. Keys are in order of fields.
+
+    Values keep their types, such as numbers and booleans, and missing
+    value is ``null`` unless ``default`` of the field is given. Value of
+    "datetime" field is formatted by its ``format``, or ISO 8601 without
+    it. Other values which are not JSON types are given as string.
+    """
+
+    def _set_fields(self, fields):
+        super(JsonLinesSink, self)._set_fields(fields)
+        encode = json.JSONEncoder(ensure_ascii=False,
+                                  default=_json_default).encode
+        self.encode = encode
+        self.keys = [encode(k) + ':' for k in self.ids]
+        self.specs = [(f['id'], f.get('default'),
+                       f.get('format') if f['type'] == 'datetime' else None)
+                      for f in self.fields]
+
+    def format(self, entry):
+        encode = self.encode
+        values = []
+        for key, (k, default, fmt) in zip(self.keys, self.specs):
+            v = entry.get(k, default)
+            if fmt and v is not None:
+                v = v.strftime(fmt)
+            values.append(key + encode(v))
+        return '{' + ','.join(values) + '}\n'
+
+
+_LTSV_ESCAPE = dict((ord(c), six.text_type(e)) for c, e in
+                    (('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')))
+
+
+def _ltsv_value(value):
+    value = _text(value)
+    if '\t' in value or '\n' in value or '\r' in value:
+        return value.translate(_LTSV_ESCAPE)
+    return value
+
+
+class LtsvSink(Sink):
+    """ Labeled tab separated values. Tab and newline in values are escaped
+    as ``\\t`` and ``\\n``.
+    """
+
+    def _set_fields(self, fields):
+        super(LtsvSink, self)._set_fields(fields)
+        self.labels = [_text(k) + ':' for k in self.ids]
+
+    def format(self, entry):
+        return '\t'.join([k + _ltsv_value(v) for k, v in
+                          zip(self.labels, self.mapper(entry))]) + '\n'
+
+
+SINKS = {
+    'csv': CsvSink,
+    'tsv': TsvSink,
+    'jsonl': JsonLinesSink,
+    'ltsv': LtsvSink
+}
+
+
+def open_sink(output_format, output, fields=None, encoding=DEFAULT_ENCODING,
+              **kwargs):
+    """ Create sink of given format.
+
+    :param output_format: one of :const:`clitool.OUTPUT_FORMATS`
+    :type output_format: string
+    :param output: path or file to write
+    :type output: string or file
+    :param fields: field definitions of
+        :class:`~clitool.textio.DictMapper` [optional]
+    :type fields: list of dict
+    :param encoding: encoding of output
+    :type encoding: string
+    :rtype: :class:`Sink`
+    """
+    if output_format not in SINKS:
+        raise ValueError('Unknown output format "{}"'.format(output_format))
+    return SINKS[output_format](output, fields, encoding, **kwargs)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Fixed-size sketches to summarize high-cardinality streams.
+
+* :class:`SpaceSaving` keeps approximate counts of the most frequent items.
+* :class:`HyperLogLog` estimates count of distinct items.
+
+Both are mergeable, so partial sketches built by workers can be combined
+into one without loss of the error bound.
+"""
+
+import hashlib
+import math
+import struct
+
+import six
+
+
+class SpaceSaving(object):
+    """ Top-K counter by Space-Saving algorithm.
+
+    At most ``2 * capacity`` items are kept. When it overflows, only
+    ``capacity`` most frequent items are left, and the largest evicted
+    count becomes the ``floor``. New item starts from the floor, so the
+    count of each item is never underestimated, and overestimated by its
+    ``error`` at most, which is bounded by ``total / capacity``.
+    Item whose true count exceeds ``total / capacity`` is always kept.
+
+    :param capacity: count of items to keep
+    :type capacity: int
+    """
+
+    def __init__(self, capacity=1000):
+        if capacity < 1:
+            raise ValueError('Capacity must be positive')
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, item, count=1):
+        """ Count given item.
+
+        :param item: hashable item
+        :param count: count to add
+        :type count: int
+        """
+        self.total += count
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+            return
+        counts[item] = self.floor + count
+        self.errors[item] = self.floor
+        if len(counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        ranked = sorted(self.counts, key=self.counts.get, reverse=True)
+        for item in ranked[self.capacity:]:
+            self.floor = max(self.floor, self.counts.pop(item))
+            del self.errors[item]
+
+    def estimate(self, item):
+        """ Upper bound of count of given item.
+
+        :param item: hashable item
+        :rtype: int
+        """
+        return self.counts.get(item, self.floor)
+
+    def top(self, k=None):
+        """ Most frequent items.
+
+        :param k: count of items (default: capacity)
+        :type k: int
+        :rtype: list of tuple (item, count, error)
+        """
+        ranked = sorted(self.counts.items(), key=lambda kv: -kv[1])
+        return [(item, count, self.errors[item])
+                for item, count in ranked[:k or self.capacity]]
+
+    def merge(self, other):
+        """ Merge counts of other sketch. Item missing on one side is
+        counted as the floor of that side.
+
+        :param other: sketch to merge
+        :type other: SpaceSaving
+        """
+        counts = {}
+        errors = {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.estimate(item) + other.estimate(item)
+            errors[item] = self.errors.get(item, self.floor) + \
+                other.errors.get(item, other.floor)
+        self.counts = counts
+        self.errors = errors
+        self.floor += other.floor
+        self.total += other.total
+        if len(counts) > self.capacity:
+            self._prune()
+
+    def state(self):
+        """ Picklable state of this sketch.
+
+        :rtype: tuple
+        """
+        return self.counts, self.errors, self.floor, self.total
+
+    @classmethod
+    def from_state(cls, state, capacity=1000):
+        """ Create sketch from :meth:`state`.
+
+        :param state: state of sketch
+        :type state: tuple
+        :param capacity: count of items to keep
+        :type capacity: int
+        :rtype: SpaceSaving
+        """
+        sketch = cls(capacity)
+        counts, errors, sketch.floor, sketch.total = state
+        sketch.counts = dict(counts)
+        sketch.errors = dict(errors)
+        return sketch
+
+
+def _hash64(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    elif not isinstance(value, six.binary_type):
+        value = repr(value).encode('utf-8')
+    return struct.unpack('>Q', hashlib.md5(value).digest()[:8])[0]
+
+
+class HyperLogLog(object):
+    """ Distinct counter by HyperLogLog algorithm.
+
+    Memory is ``2 ** precision`` bytes, and standard error of estimate is
+    about ``1.04 / sqrt(2 ** precision)``, 1.6% on default precision 12.
+    Small cardinality is estimated by linear counting.
+
+    :param precision: count of bits to choose register, 4 to 16
+    :type precision: int
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError('Precision must be in 4 to 16')
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        """ Add given value.
+
+        :param value: string or any object which has stable ``repr``
+        """
+        h = _hash64(value)
+        p = self.precision
+        index = h >> (64 - p)
+        rest = h & ((1 << (64 - p)) - 1)
+        rank = 64 - p - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """ Estimated count of distinct values.
+
+        :rtype: int
+        """
+        m = len(self.registers)
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(b'\x00')
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        """ Merge registers of other counter with same precision.
+
+        :param other: counter to merge
+        :type other: HyperLogLog
+        """
+        if other.precision != self.precision:
+            raise ValueError('Precision differs: {} != {}'.format(
+                self.precision, other.precision))
+        self.registers = bytearray(
+            max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def state(self):
+        """ Picklable state of this counter.
+
+        :rtype: bytes
+        """
+        return bytes(self.registers)
+
+    @classmethod
+    def from_state(cls, state):
+        """ Create counter from :meth:`state`.
+
+        :param state: registers
+        :type state: bytes
+        :rtype: HyperLogLog
+        """
+        precision = len(state).bit_length() - 1
+        hll = cls(precision)
+        hll.registers = bytearray(state)
+        return hll
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -31,9 +31,21 @@ Example usage::
 
 """
 
+import codecs
+import io
+import json
+import logging
+import mmap
+import os
+import stat
 import sys
 from datetime import datetime
 
+import six
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+
 
 class Sequential(object):
     """Apply callback functions sequentially.
@@ -157,4 +169,267 @@ class DictMapper(object):
         return out
 
 
+# size of each read of byte_lines()
+LINE_BUFFER_SIZE = 1024 * 1024
+
+
+def byte_lines(fp, bufsize=LINE_BUFFER_SIZE):
+    """ Iterate lines of binary file as bytes without decoding.
+
+    Raw file opened without buffering, such as ``open(name, 'rb', 0)``, is
+    read by ``readinto`` into a buffer of ``bufsize`` bytes, and lines are
+    split on the buffer by :class:`io.BufferedReader`. It is faster than
+    splitting blocks in Python. Buffered file is returned as it is.
+    Each line keeps ``\\n`` at the end as ``readline`` does. Close returned
+    file instead of given one.
+
+    :param fp: binary file
+    :type fp: file
+    :param bufsize: size of buffer for raw file
+    :type bufsize: int
+    :rtype: file
+    """
+    if isinstance(fp, io.RawIOBase):
+        return io.BufferedReader(fp, bufsize)
+    return fp
+
+
+class MappedLines(object):
+    """ Lines of regular file mapped to memory by :mod:`mmap`.
+
+    Lines are read from the mapped pages without copy through buffer of
+    file object. If ``view`` is true, each line is given as
+    :class:`memoryview` of the pages without copy, otherwise as ``bytes``
+    split by :meth:`mmap.mmap.readline`. If ``encoding`` is given, lines
+    are decoded instead. Each line keeps ``\\n`` at the end. Note that
+    slicing :class:`memoryview` costs more than copying short line to
+    ``bytes``, so that view is for long lines or fields, or to avoid
+    copies of huge lines. Since :mod:`mmap` of Python 2 does not support
+    :class:`memoryview`, lines are given as ``bytes`` there.
+
+    :class:`memoryview` supports slicing, comparison, and search by
+    compiled ``bytes`` pattern of :mod:`re` without copy. Since slice refers
+    to the mapped pages, the pages are kept until all slices are released
+    even after :meth:`close`. Processes mapping the same file share pages
+    of the page cache.
+
+    Pipe or terminal can not be mapped, so :class:`ValueError` or
+    :class:`EnvironmentError` is raised by constructor for them. ::
+
+        try:
+            lines = MappedLines(fp)
+        except (ValueError, EnvironmentError):
+            lines = byte_lines(fp.buffer)
+
+    :param fp: opened regular file or file descriptor
+    :type fp: file or int
+    :param start: byte offset to start (default: 0)
+    :type start: int
+    :param end: byte offset to stop (default: end of file)
+    :type end: int
+    :param view: give lines as :class:`memoryview` (default: True)
+    :type view: bool
+    :param encoding: encoding to decode lines [optional]
+    :type encoding: string
+    """
+
+    def __init__(self, fp, start=0, end=None, view=True, encoding=None):
+        fileno = fp if isinstance(fp, int) else fp.fileno()
+        st = os.fstat(fileno)
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError('Only regular file can be mapped')
+        self.mm = None
+        # Empty file can not be mapped.
+        if st.st_size:
+            self.mm = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        self.start = start
+        self.end = st.st_size if end is None else min(end, st.st_size)
+        self.view = view
+        self.encoding = encoding
+
+    def seek(self, offset):
+        """ Start iteration from given byte offset.
+
+        :param offset: byte offset
+        :type offset: int
+        """
+        self.start = offset
+
+    def __iter__(self):
+        mm = self.mm
+        if mm is None:
+            return iter(())
+        if self.view and not self.encoding:
+            return self._views()
+        mm.seek(self.start)
+        lines = iter(mm.readline, b'')
+        if self.end < len(mm):
+            lines = self._until(lines)
+        if self.encoding:
+            lines = self._decoded(lines)
+        return lines
+
+    def _views(self):
+        mm = self.mm
+        find = mm.find
+        try:
+            source = memoryview(mm)
+        except TypeError:
+            # Slice of mmap is copied to bytes.
+            source = mm
+        pos, end = self.start, self.end
+        while pos < end:
+            n = find(b'\n', pos, end)
+            n = end if n == -1 else n + 1
+            yield source[pos:n]
+            pos = n
+
+    def _until(self, lines):
+        tell = self.mm.tell
+        end = self.end
+        for line in lines:
+            pos = tell()
+            if pos >= end:
+                yield line[:len(line) - (pos - end)]
+                return
+            yield line
+
+    def _decoded(self, lines):
+        encoding = self.encoding
+        for line in lines:
+            yield line.decode(encoding)
+
+    def close(self):
+        """ Unmap the file. If slices are still referred, the pages are
+        unmapped when they are released.
+        """
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                pass
+
+
+def decode(line, encoding='utf-8', errors='strict'):
+    """ Decode line given to procedure in bytes mode.
+    ``bytes`` and ``memoryview`` are decoded, and text is returned as it is.
+    Decode only lines or fields to keep after cheap checks on bytes. ::
+
+        @bytes_aware
+        def parse_error(line):
+            if b'" 500 ' not in line:
+                return
+            return parse(decode(line))
+
+    :param line: line or field
+    :type line: bytes, memoryview or string
+    :param encoding: encoding of line (default: utf-8)
+    :type encoding: string
+    :param errors: error handler of decoding (default: strict)
+    :type errors: string
+    :rtype: string
+    """
+    if isinstance(line, six.text_type):
+        return line
+    if isinstance(line, memoryview):
+        line = line.tobytes()
+    return codecs.decode(line, encoding, errors)
+
+
+def json_lines(lines):
+    """ Parse each line of JSON Lines (``.jsonl``, ``.ndjson``).
+
+    Blank line is ignored. Line which is not valid JSON is logged and
+    ``None`` is yielded instead, so that it is counted as skipped by
+    streamer.
+
+    :param lines: iterable of lines such as opened file
+    :type lines: iterable
+    :rtype: generator
+    """
+    decode = json.JSONDecoder().decode
+    for i, line in enumerate(lines):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield decode(line)
+        except ValueError:
+            e = sys.exc_info()[1]
+            logging.warning("Invalid JSON on line %d: %s", i + 1, e)
+            yield None
+
+
+def json_array(fp, bufsize=65536):
+    """ Parse elements of top-level JSON array one by one.
+
+    Text is read by ``bufsize`` characters and consumed text is dropped, so
+    that only one element and one buffer are kept in memory. If top-level
+    value is not array, whole document is loaded and iterated as before.
+
+    :param fp: opened text file
+    :type fp: file
+    :param bufsize: size of each read
+    :type bufsize: int
+    :rtype: generator
+    """
+    raw_decode = json.JSONDecoder().raw_decode
+    buf = fp.read(bufsize)
+    pos = _skip(buf, 0)
+    while pos == len(buf):
+        buf = fp.read(bufsize)
+        if not buf:
+            return
+        pos = _skip(buf, 0)
+    if buf[pos] != '[':
+        for v in json.loads(buf[pos:] + fp.read()):
+            yield v
+        return
+    pos += 1
+    eof = False
+    value_expected = True
+    first = True
+    while 1:
+        pos = _skip(buf, pos)
+        if pos < len(buf):
+            if value_expected:
+                if first and buf[pos] == ']':
+                    return
+                try:
+                    value, end = raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    end = len(buf)
+                # Number or literal may continue on next read.
+                if eof or end < len(buf) and buf[end] in _DELIMITERS:
+                    yield value
+                    pos = end
+                    value_expected = first = False
+                    continue
+            elif buf[pos] == ']':
+                return
+            elif buf[pos] == ',':
+                pos += 1
+                value_expected = True
+                continue
+            else:
+                raise ValueError('Expecting "," or "]": char %d' % (pos, ))
+        if eof:
+            raise ValueError('Unterminated JSON array')
+        data = fp.read(bufsize)
+        eof = not data
+        buf = buf[pos:] + data
+        pos = 0
+
+
+def _skip(buf, pos):
+    end = len(buf)
+    while pos < end and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import shutil
+import tempfile
+
+from clitool.aio import AsyncStreamer
+from clitool.processor import CliHandler
+from clitool import (
+    PROCESSING_SUCCESS,
+    PROCESSING_SKIPPED,
+    PROCESSING_ERROR,
+    PROCESSING_TOTAL,
+    PROCESSING_TIME
+)
+
+
+async def lookup(n):
+    await asyncio.sleep(0.01)
+    if n % 3 == 0:
+        return False
+    return n * 10
+
+
+def drop_odd(n):
+    if n % 2 == 0:
+        return n
+
+
+def test_async_streamer():
+    results = []
+    s = AsyncStreamer(results.append, drop_odd, lookup, concurrency=50)
+    stats = s.consume(range(100))
+    assert len(stats) == 5
+    assert stats[PROCESSING_TOTAL] == 100
+    assert stats[PROCESSING_SKIPPED] == 51
+    assert stats[PROCESSING_ERROR] == 16
+    assert stats[PROCESSING_SUCCESS] == 33
+    # 100 sleeps run concurrently.
+    assert stats[PROCESSING_TIME] < 0.5
+    assert sorted(results)[:3] == [20, 40, 80]
+
+
+def test_async_streamer_async_input():
+
+    async def numbers():
+        for i in range(1, 11):
+            await asyncio.sleep(0)
+            yield i
+
+    results = []
+    s = AsyncStreamer(results.append, lookup, drop_odd, executor='thread')
+    with s:
+        assert s.pool is not None
+        stats = s.consume(numbers())
+    assert stats[PROCESSING_TOTAL] == 10
+    assert stats[PROCESSING_ERROR] == 0
+    assert stats[PROCESSING_SKIPPED] == 3
+    assert sorted(results) == [10, 20, 40, 50, 70, 80, 100]
+
+
+def test_async_streamer_failure():
+
+    async def raise_error(n):
+        raise ValueError(n)
+
+    s = AsyncStreamer(None, raise_error)
+    stats = s.consume(range(1, 11))
+    assert stats[PROCESSING_SUCCESS] == 0
+
+
+async def length(line):
+    await asyncio.sleep(0)
+    return len(line.rstrip())
+
+
+def test_clihandler_async_streamer():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'numbers.txt')
+        with open(name, 'w') as fp:
+            for i in range(1000):
+                fp.write('%09d\n' % (i, ))
+        results = []
+        handler = CliHandler(AsyncStreamer(results.append, length))
+        stats = handler.handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 1000
+        assert set(results) == set([9])
+        # blocks of file are sampled by handler
+        handler = CliHandler(AsyncStreamer(None, length, sample=0.5,
+                                           seed=1))
+        handler.sample_block = 1000
+        stats = handler.handle([open(name)], 'utf-8')
+        assert stats[0]['sampling'] == 0.5
+        assert 0 < stats[0][PROCESSING_TOTAL] < 1000
+    finally:
+        shutil.rmtree(tmpdir)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
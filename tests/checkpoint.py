@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import shutil
+import tempfile
+
+from clitool.checkpoint import Checkpoint
+from clitool.processor import SimpleDictReporter, Streamer
+
+from clitool import (
+    PROCESSING_SUCCESS,
+    PROCESSING_SKIPPED,
+    PROCESSING_TOTAL
+)
+
+LINES = [b'key,%d\n' % (i % 3, ) for i in range(30)]
+
+
+def parse(line):
+    if not isinstance(line, str):
+        line = line.decode('utf-8')
+    k, v = line.strip().split(',')
+    return {k: v}
+
+
+class FailingReporter(SimpleDictReporter):
+
+    def __init__(self, limit):
+        super(FailingReporter, self).__init__()
+        self.limit = limit
+        self.count = 0
+
+    def __call__(self, entry):
+        self.count += 1
+        if self.count == self.limit:
+            raise KeyboardInterrupt()
+        super(FailingReporter, self).__call__(entry)
+
+
+def _resume(tmpdir, stream_factory, chunksize=1, **kwargs):
+    path = os.path.join(tmpdir, 'job.ckpt')
+    reporter = FailingReporter(11)
+    s = Streamer(reporter, parse,
+                 checkpoint=Checkpoint(path, reporter, interval=0), **kwargs)
+    try:
+        s.consume(stream_factory(), source='input', chunksize=chunksize)
+    except KeyboardInterrupt:
+        pass
+    else:
+        assert False, 'must be interrupted'
+    assert os.path.exists(path)
+    assert not os.path.exists(path + '.tmp')
+
+    reporter = SimpleDictReporter()
+    checkpoint = Checkpoint(path, reporter, interval=0, resume=True)
+    assert checkpoint.start('input')['position'] == 10
+    s = Streamer(reporter, parse, checkpoint=checkpoint, **kwargs)
+    stats = s.consume(stream_factory(), source='input', chunksize=chunksize)
+    assert stats[PROCESSING_TOTAL] == 30
+    assert stats[PROCESSING_SUCCESS] == 30
+    assert reporter.report() == {'key:0': 10, 'key:1': 10, 'key:2': 10}
+    return path
+
+
+def test_checkpoint_resume_serial():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = _resume(tmpdir, lambda: io.BytesIO(b''.join(LINES)))
+        # Finished source is not read again.
+        reporter = SimpleDictReporter()
+        checkpoint = Checkpoint(path, reporter, resume=True)
+        record = checkpoint.start('input')
+        assert record['finished']
+        assert record['offset'] == 180
+        s = Streamer(reporter, parse, checkpoint=checkpoint)
+        stats = s.consume(iter(()), source='input')
+        assert stats[PROCESSING_TOTAL] == 30
+        assert reporter.report()['key:0'] == 10
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_checkpoint_offset():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'job.ckpt')
+        checkpoint = Checkpoint(path, interval=0)
+        s = Streamer(None, parse, checkpoint=checkpoint)
+        lines = [b''] + LINES
+        s.consume(iter(lines[:11]), source='input')
+        # Resume from 10 lines in middle of stream.
+        checkpoint.sources['input']['finished'] = False
+        assert checkpoint.sources['input']['offset'] == 60
+        stream = io.BytesIO(b''.join(lines))
+        stats = s.consume(stream, source='input')
+        assert stats[PROCESSING_TOTAL] == 31
+        assert stats[PROCESSING_SKIPPED] == 1
+        assert stats[PROCESSING_SUCCESS] == 30
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_checkpoint_resume_parallel():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        _resume(tmpdir, lambda: iter(LINES), processes=2, chunksize=3)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_checkpoint_forces_ordered():
+    s = Streamer(None, parse, processes=2, checkpoint=Checkpoint('unused'))
+    assert s.ordered
+    try:
+        Streamer(None, parse, processes=2, fused=False,
+                 checkpoint=Checkpoint('unused'))
+    except ValueError:
+        pass
+    else:
+        assert False, 'unfused procedures must be refused'
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
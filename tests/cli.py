@@ -20,6 +20,7 @@ def test_default_settings():
     assert args.input_encoding == DEFAULT_ENCODING
     assert args.output_encoding == DEFAULT_ENCODING
     assert args.output == sys.stdout
+    assert args.executor is None
 
 
 def test_logging_settings():
@@ -34,6 +35,37 @@ def test_logging_settings():
     assert args.verbose == 3
 
 
+def test_chunksize_settings():
+    sys.argv = [__file__, ]
+    args = parse_arguments()
+    assert args.chunksize == 1
+    sys.argv = [__file__, '--chunksize', '100']
+    args = parse_arguments()
+    assert args.chunksize == 100
+    sys.argv = [__file__, '--chunksize', 'auto']
+    args = parse_arguments()
+    assert args.chunksize == 'auto'
+
+
+def test_clistream_executor():
+    dt = []
+    sys.stdin = StringIO()
+    sys.stdin.write('A,B,C\n1,2,3\n')
+    sys.stdin.seek(0)
+    clistream(dt.append, lambda l: l.rstrip('\r\n'),
+              processes=2, executor='thread', ordered=True)
+    assert dt == ['A,B,C', '1,2,3']
+
+
+def test_clistream_resume_without_checkpoint():
+    try:
+        clistream(None, resume=True)
+    except ValueError:
+        pass
+    else:
+        assert False, 'resume requires checkpoint'
+
+
 def test_clistream():
     dt = []
     sys.stdin = StringIO()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bz2
+import gzip
+import io
+import os
+import shutil
+import tempfile
+
+import six
+from six import PY3
+
+from clitool import compress
+from clitool.compress import (
+    CODECS, PrefetchReader, open_compressed, split_suffix
+)
+from clitool.processor import CliHandler, Streamer
+
+from clitool import PROCESSING_SUCCESS
+
+OPENERS = {'.gz': gzip.GzipFile, '.bz2': bz2.BZ2File}
+if '.xz' in CODECS:
+    OPENERS['.xz'] = CODECS['.xz']
+
+
+def test_split_suffix():
+    assert split_suffix('access.log.gz') == ('.gz', '.log')
+    assert split_suffix('data.csv.BZ2') == ('.bz2', '.csv')
+    assert split_suffix('data.csv') == (None, '.csv')
+    assert split_suffix('data') == (None, '')
+
+
+def test_split_suffix_without_lzma(monkeypatch):
+    monkeypatch.setattr(compress, 'CODECS', {'.gz': gzip.GzipFile})
+    try:
+        split_suffix('access.log.xz')
+    except ValueError:
+        pass
+    else:
+        assert False, 'xz is not read as plain text'
+
+
+def test_open_compressed():
+    tmpdir = tempfile.mkdtemp()
+    data = b''.join(('line %d\n' % (i, )).encode('ascii')
+                    for i in range(10000))
+    try:
+        for codec, opener in OPENERS.items():
+            name = os.path.join(tmpdir, 'access.log' + codec)
+            with opener(name, 'wb') as fp:
+                fp.write(data)
+            for prefetch in (False, True):
+                fp = open_compressed(name, prefetch=prefetch, bufsize=4096)
+                assert fp.read() == data
+                fp.close()
+                fp = open_compressed(name, prefetch=prefetch, bufsize=4096)
+                assert fp.readline() == b'line 0\n'
+                # BZ2File of Python 2 has no file descriptor.
+                if PY3 or codec != '.bz2':
+                    assert fp.fileno() > 0
+                fp.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+class ReadOnly(object):
+    """ File which has only ``read`` and ``close`` as BZ2File of Python 2.
+    """
+
+    def __init__(self, name, mode):
+        self.fp = bz2.BZ2File(name, mode)
+
+    def read(self, size=-1):
+        return self.fp.read(size)
+
+    def close(self):
+        self.fp.close()
+
+
+def test_open_compressed_read_only(monkeypatch):
+    monkeypatch.setitem(CODECS, '.bz2', ReadOnly)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log.bz2')
+        with bz2.BZ2File(name, 'wb') as fp:
+            fp.write(b'a\nbb\n' * 1000)
+        fp = open_compressed(name, bufsize=10)
+        assert fp.readline() == b'a\n'
+        assert len(fp.read()) == 5 * 1000 - 2
+        fp.close()
+        assert fp.raw.fp.fp.closed
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_prefetch_reader_close():
+    raw = io.BytesIO(b'x' * 100000)
+    reader = PrefetchReader(raw, chunksize=10, depth=2)
+    assert reader.read(5) == b'xxxxx'
+    reader.close()
+    assert not reader.thread.is_alive()
+    assert raw.closed
+
+
+def test_clihandler_chained_suffix():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'data.csv.gz')
+        with gzip.open(name, 'wb') as fp:
+            fp.write(six.u('a,b\n1,"\u3042\ni"\n').encode('utf-8'))
+        for prefetch in (False, True):
+            dt = []
+            handler = CliHandler(Streamer(dt.append), prefetch=prefetch)
+            stats = handler.handle([open(name)], 'utf-8')
+            assert stats[0][PROCESSING_SUCCESS] == 2
+            assert dt == [['a', 'b'], ['1', six.u('\u3042\ni')]]
+        name = os.path.join(tmpdir, 'data.json.bz2')
+        with bz2.BZ2File(name, 'wb') as fp:
+            fp.write(b'[{"a": 1}, {"a": 2}]')
+        dt = []
+        CliHandler(Streamer(dt.append)).handle([open(name)], 'utf-8')
+        assert dt == [{'a': 1}, {'a': 2}]
+        name = os.path.join(tmpdir, 'data.ndjson.gz')
+        with gzip.open(name, 'wb') as fp:
+            fp.write(b'{"a": 1}\n\n{"a": 2}\n')
+        dt = []
+        CliHandler(Streamer(dt.append)).handle([open(name)], 'utf-8')
+        assert dt == [{'a': 1}, {'a': 2}]
+    finally:
+        shutil.rmtree(tmpdir)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
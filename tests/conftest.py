@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # "async" and "await" syntax is available on Python 3.5 or later.
+    collect_ignore.append('aio.py')
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
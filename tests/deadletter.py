@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+
+from six import StringIO
+
+from clitool import deadletter
+from clitool.deadletter import DeadLetter
+from clitool.processor import CliHandler, Streamer, batched
+
+from clitool import (
+    PROCESSING_SUCCESS,
+    PROCESSING_SKIPPED,
+    PROCESSING_ERROR,
+    PROCESSING_TOTAL
+)
+
+
+def parse(line):
+    if line.startswith('#'):
+        return None
+    if line.startswith('!'):
+        return False
+    k, v = line.strip().split(',')
+    return {k: v}
+
+
+@batched
+def explode_batch(entries):
+    if any('boom' in e for e in entries):
+        raise RuntimeError('boom')
+    return entries
+
+
+def _records(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def _check(records):
+    by_input = dict((r['input'], r) for r in records)
+    assert by_input[''] == {'stage': 'input', 'status': 'skipped',
+                            'error': None, 'input': '', 'source': 'input'}
+    assert by_input['# comment']['stage'] == 'parse'
+    assert by_input['# comment']['status'] == 'skipped'
+    assert by_input['!bang']['status'] == 'error'
+    assert by_input['!bang']['error'] is None
+    assert by_input['broken']['status'] == 'error'
+    assert by_input['broken']['error'].startswith('ValueError: ')
+
+
+LINES = ['a,1', '', '# comment', '!bang', 'broken', 'b,2']
+
+
+def test_dead_letter_serial():
+    output = StringIO()
+    with DeadLetter(output) as dl:
+        s = Streamer(None, parse, dead_letter=dl)
+        stats = s.consume(LINES, source='input')
+    assert stats[PROCESSING_TOTAL] == 6
+    assert stats[PROCESSING_SUCCESS] == 2
+    assert stats[PROCESSING_SKIPPED] == 2
+    assert stats[PROCESSING_ERROR] == 2
+    records = _records(output)
+    assert len(records) == 4
+    _check(records)
+    with DeadLetter(StringIO()) as dl:
+        s = Streamer(None, parse, dead_letter=dl)
+        stats = s.consume(LINES, source='input', chunksize=None)
+    assert stats[PROCESSING_TOTAL] == 6
+    assert stats[PROCESSING_ERROR] == 2
+
+
+def test_dead_letter_parallel():
+    output = StringIO()
+    dl = DeadLetter(output, skipped=False)
+    s = Streamer(None, parse, processes=2, dead_letter=dl)
+    stats = s.consume(LINES, source='input', chunksize=2)
+    dl.close()
+    assert stats[PROCESSING_ERROR] == 2
+    records = _records(output)
+    assert sorted(r['input'] for r in records) == ['!bang', 'broken']
+
+
+def test_dead_letter_batched_stage():
+    output = StringIO()
+    dl = DeadLetter(output)
+    s = Streamer(None, parse, explode_batch, dead_letter=dl, batchsize=2)
+    stats = s.consume(['a,1', 'b,2', 'boom,1', 'c,3'])
+    dl.close()
+    assert stats[PROCESSING_SUCCESS] == 2
+    assert stats[PROCESSING_ERROR] == 2
+    records = _records(output)
+    assert [r['input'] for r in records] == ['boom,1', 'c,3']
+    assert records[0]['stage'] == 'explode_batch'
+    assert records[0]['error'] == 'RuntimeError: boom'
+
+
+def test_dead_letter_rate(monkeypatch):
+    monkeypatch.setattr(deadletter.time, 'time', lambda: 100.0)
+    output = StringIO()
+    dl = DeadLetter(output, rate=3, bufsize=2)
+    dl.write([('x', 'parse', 'error', None)] * 5)
+    assert dl.written == 3
+    assert dl.dropped == 2
+    dl.write([('y', 'parse', 'error', None)])
+    assert dl.dropped == 3
+    monkeypatch.setattr(deadletter.time, 'time', lambda: 101.0)
+    dl.write([('z', 'parse', 'error', None)])
+    dl.close()
+    assert [r['input'] for r in _records(output)] == ['x'] * 3 + ['z']
+
+
+def test_dead_letter_file_partition():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        names = []
+        for i in range(2):
+            name = os.path.join(tmpdir, 'input%d.txt' % (i, ))
+            with open(name, 'w') as fp:
+                fp.write('a,1\n!bang\n')
+            names.append(name)
+        output = StringIO()
+        with DeadLetter(output) as dl:
+            s = Streamer(None, parse, processes=2, dead_letter=dl)
+            CliHandler(s, partition='file').handle(
+                [open(n) for n in names], 'utf-8')
+        records = _records(output)
+        assert sorted(r['source'] for r in records) == names
+        assert all(r['input'] == '!bang\n' for r in records)
+    finally:
+        shutil.rmtree(tmpdir)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import six
+
+from clitool import processor
+from clitool.follow import Follower
+from clitool.processor import CliHandler, Streamer
+
+from clitool import PROCESSING_SUCCESS
+
+
+def _write(name, data, mode='ab'):
+    with open(name, mode) as fp:
+        fp.write(data)
+
+
+def test_follow_rotation():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        _write(name, b'a\nb')
+        follower = Follower(name, from_start=True, interval=0.01,
+                            idle_timeout=0.1)
+        it = iter(follower)
+        assert next(it) == b'a\n'
+        _write(name, b'c\n')
+        assert next(it) == b'bc\n'
+        # rotated file is read to the end before new one
+        os.rename(name, name + '.1')
+        _write(name + '.1', b'd\n')
+        _write(name, b'e\n')
+        assert next(it) == b'd\n'
+        assert next(it) == b'e\n'
+        _write(name, b'fff\n')
+        assert next(it) == b'fff\n'
+        # truncated
+        _write(name, b'g\n', 'wb')
+        assert next(it) == b'g\n'
+        start = time.time()
+        assert list(it) == []
+        assert time.time() - start >= 0.1
+        follower.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_follow_offset():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        offset = os.path.join(tmpdir, 'offset.json')
+        _write(name, b'a\nb\n')
+        # without saved offset, start from the end
+        follower = Follower(name, offset=offset, idle_timeout=0.05)
+        assert list(follower) == []
+        follower.close()
+        _write(name, six.u('\u3042\nc\n').encode('utf-8'))
+        follower = Follower(name, offset=offset, encoding='utf-8',
+                            idle_timeout=0.05)
+        it = iter(follower)
+        assert next(it) == six.u('\u3042\n')
+        follower.close()
+        with open(offset) as fp:
+            assert json.load(fp)['offset'] == 4
+        # not consumed line is read again
+        follower = Follower(name, offset=offset, idle_timeout=0.05)
+        assert list(follower) == [b'\xe3\x81\x82\n', b'c\n']
+        follower.close()
+        with open(offset) as fp:
+            assert json.load(fp)['offset'] == 10
+        # replaced while stopped
+        _write(name + '.new', b'x\n')
+        os.rename(name + '.new', name)
+        follower = Follower(name, offset=offset, idle_timeout=0.05)
+        assert list(follower) == [b'x\n']
+        follower.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_clihandler_follow(monkeypatch):
+    monkeypatch.setattr(processor, 'Follower', functools.partial(
+        Follower, from_start=True, interval=0.01, idle_timeout=0.05))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.tsv')
+        offset = os.path.join(tmpdir, 'offset.json')
+        _write(name, b'a\t1\nb\t2\n')
+        results = []
+        handler = CliHandler(Streamer(results.append), follow_offset=offset)
+        stats = handler.handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 2
+        assert results == [['a', '1'], ['b', '2']]
+        with open(offset) as fp:
+            assert json.load(fp)['offset'] == 8
+        files = [open(name), open(name)]
+        try:
+            handler.handle(files, 'utf-8')
+        except ValueError:
+            pass
+        else:
+            assert False, 'only one file can be followed'
+        finally:
+            for fp in files:
+                fp.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_follow_close_from_another_thread():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        offset = os.path.join(tmpdir, 'offset.json')
+        _write(name, b'a\nb\n')
+        follower = Follower(name, offset=offset, from_start=True,
+                            interval=10)
+        lines = []
+
+        def run():
+            for line in follower:
+                lines.append(line)
+
+        t = threading.Thread(target=run)
+        t.daemon = True
+        t.start()
+        while len(lines) < 2:
+            time.sleep(0.01)
+        # interrupted while waiting for appended lines
+        start = time.time()
+        follower.close()
+        t.join(5)
+        assert not t.is_alive()
+        assert time.time() - start < 5
+        assert lines == [b'a\n', b'b\n']
+        with open(offset) as fp:
+            assert json.load(fp)['offset'] == 4
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_clihandler_follow_parallel():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        _write(name, b'a\n')
+        for executor in ('process', 'thread'):
+            s = Streamer(None, processes=2, executor=executor)
+            handler = CliHandler(s, follow=True)
+            fp = open(name)
+            try:
+                handler.handle([fp], 'utf-8')
+            except ValueError:
+                pass
+            else:
+                assert False, 'pool reads lines ahead of workers'
+            finally:
+                fp.close()
+            assert s.pool is None
+    finally:
+        shutil.rmtree(tmpdir)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -1,22 +1,32 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import logging
+import os
+import re
+import shutil
 import sys
+import tempfile
 
-from six import StringIO
+from six import PY3, StringIO
 
 from clitool.processor import (
     CliHandler,
     RowMapper,
     SimpleDictReporter,
-    Streamer
+    Streamer,
+    batched,
+    bytes_aware
 )
+from clitool.textio import decode
 
 from clitool import (
     PROCESSING_SUCCESS,
     PROCESSING_SKIPPED,
     PROCESSING_ERROR,
-    PROCESSING_TOTAL
+    PROCESSING_TOTAL,
+    PROCESSING_PROCEDURES,
+    PROCESSING_SAMPLING
 )
 
 ACCESSLOG = """
@@ -117,6 +127,143 @@ def test_streamer_ipaddrcount2():
     assert len(results) == 8
 
 
+def test_streamer_batched():
+
+    calls = []
+
+    @batched
+    def split_host(lines):
+        calls.append(len(lines))
+        return [None if l.startswith('21') else l.split()[0] for l in lines]
+
+    def check_local(host):
+        return False if host.startswith('119') else host
+
+    results = []
+    s = Streamer(results.append, split_host, check_local, batchsize=3)
+    stats = s.consume(ACCESSLOG)
+    assert stats[PROCESSING_TOTAL] == 8
+    assert stats[PROCESSING_SUCCESS] == 2
+    assert stats[PROCESSING_SKIPPED] == 5
+    assert stats[PROCESSING_ERROR] == 1
+    assert results == ['178.154.243.119', '201.140.105.102']
+    assert calls == [3, 3, 2]
+
+
+def test_streamer_thread_executor():
+    results = []
+    s = Streamer(results.append, lambda l: l.split()[0],
+                 processes=2, executor='thread')
+    with s:
+        assert s.pool is not None
+        stats = s.consume(ACCESSLOG, chunksize=3)
+    assert len(stats) == 5
+    assert stats[PROCESSING_TOTAL] == 8
+    assert stats[PROCESSING_SUCCESS] == 8
+    assert sorted(results)[0] == '119.63.196.88'
+
+
+def test_streamer_serial_executor():
+    s = Streamer(None, lambda l: l, processes=2, executor='serial')
+    with s:
+        assert s.pool is None
+        stats = s.consume(ACCESSLOG)
+    assert stats[PROCESSING_SUCCESS] == 8
+
+
+def test_streamer_instrument():
+
+    def split_host(line):
+        return line.split()[0]
+
+    def check_local(host):
+        if host.startswith('21'):
+            return
+        return False if host.startswith('119') else host
+
+    s = Streamer(None, split_host, check_local, instrument=True)
+    stats = s.consume(ACCESSLOG)
+    assert stats[PROCESSING_SUCCESS] == 2
+    procs = stats[PROCESSING_PROCEDURES]
+    assert [p['name'] for p in procs] == ['split_host', 'check_local']
+    assert procs[0]['calls'] == 8
+    assert procs[0]['skipped'] == 0
+    assert procs[1]['calls'] == 8
+    assert procs[1]['skipped'] == 5
+    assert procs[1]['error'] == 1
+    for p in procs:
+        assert p['time'] > 0
+        assert 0 < p['p50'] <= p['p95'] <= p['p99']
+    # chunk size is not given by handler
+    stats = s.consume(ACCESSLOG, chunksize=None)
+    assert stats[PROCESSING_TOTAL] == 8
+    assert stats[PROCESSING_PROCEDURES][0]['calls'] == 8
+
+
+def test_streamer_progress(caplog):
+    caplog.set_level(logging.INFO)
+    with tempfile.TemporaryFile('w+') as fp:
+        fp.write('\n'.join(ACCESSLOG))
+        fp.seek(0)
+        s = Streamer(None, reporting_seconds=1e-9)
+        stats = s.consume(fp, fileno=fp.fileno())
+    assert stats[PROCESSING_TOTAL] == 8
+    msgs = [r.getMessage() for r in caplog.records if 'ETA' in r.getMessage()]
+    assert msgs
+    assert '100.0%' in msgs[-1]
+
+
+def test_streamer_progress_stream(caplog):
+    caplog.set_level(logging.INFO)
+    s = Streamer(None, reporting_seconds=1e-9)
+    stats = s.consume(ACCESSLOG)
+    assert stats[PROCESSING_TOTAL] == 8
+    msgs = [r.getMessage() for r in caplog.records if 'Processed' in
+            r.getMessage()]
+    assert 'B/sec' in msgs[-1]
+    caplog.clear()
+    # size of rows is not counted
+    stats = s.consume([line.split() for line in ACCESSLOG])
+    assert stats[PROCESSING_TOTAL] == 8
+    msgs = [r.getMessage() for r in caplog.records if 'Processed' in
+            r.getMessage()]
+    assert msgs and 'items/sec' in msgs[-1]
+    assert 'B/sec' not in msgs[-1]
+
+
+def test_streamer_sample():
+    dt = []
+    s = Streamer(dt.append, sample=0.1, seed=1)
+    stats = s.consume(range(1, 10001))
+    assert stats[PROCESSING_SAMPLING] == 0.1
+    assert 800 < stats[PROCESSING_TOTAL] < 1200
+    assert dt == sorted(set(dt))
+    s = Streamer(None, sample=0.1, seed=1)
+    again = s.consume(range(1, 10001))
+    assert again[PROCESSING_TOTAL] == stats[PROCESSING_TOTAL]
+    s = Streamer(None, sample=1.0, limit=3)
+    stats = s.consume(range(1, 10001))
+    assert PROCESSING_SAMPLING not in stats
+    assert stats[PROCESSING_TOTAL] == 3
+
+
+def test_clihandler_sample_offsets():
+    with tempfile.NamedTemporaryFile('w', suffix='.log') as fp:
+        for i in range(10000):
+            fp.write('line %04d\n' % (i, ))
+        fp.flush()
+        dt = []
+        s = Streamer(dt.append, sample=0.25, seed=1)
+        handler = CliHandler(s)
+        handler.sample_block = 1000
+        stats = handler.handle([open(fp.name)], 'utf-8')
+    assert stats[0][PROCESSING_SAMPLING] == 0.25
+    # 25 blocks of 100 lines
+    assert stats[0][PROCESSING_TOTAL] == 2500
+    assert len(set(dt)) == 2500
+    assert all(len(l) == 10 for l in dt)
+
+
 def test_simple_dict_reporter():
     reporter = SimpleDictReporter()
     reporter(None)
@@ -145,6 +292,30 @@ def test_simple_dict_reporter():
     assert report['sample_str:SAMPLE'] == 2, "incremented"
 
 
+def test_simple_dict_reporter_fields():
+    reporter = SimpleDictReporter(fields=('method', 'status'),
+                                  types=(str, int))
+    reporter({'method': 'GET', 'status': 200, 'path': '/'})
+    reporter({'method': 'GET', 'status': 404, 'size': 0})
+    reporter({'status': True})
+    assert reporter.report_fields() == {
+        'method': {'GET': 2}, 'status': {200: 1, 404: 1}}
+    assert reporter.report() == {
+        'method:GET': 2, 'status:200': 1, 'status:404': 1}
+    assert reporter.counter['method:GET'] == 2
+
+
+def test_simple_dict_reporter_merge():
+    reporter = SimpleDictReporter()
+    reporter({'k': 'a'})
+    forked = reporter.fork()
+    assert forked.report() == {}
+    forked({'k': 'a'})
+    forked({'k': 'b'})
+    reporter.merge(forked.state())
+    assert reporter.report() == {'k:a': 2, 'k:b': 1}
+
+
 def test_row_mapper():
     mapper = RowMapper()
     r = mapper(['field1', 'field2', 'field3'])
@@ -219,4 +390,85 @@ def test_clihander_delimiter():
     assert r['B'] == '2'
     assert r['C'] == '3'
 
+
+@bytes_aware
+def host_of_post(line):
+    if b'POST' not in line:
+        return
+    return decode(line.split(b' ', 1)[0])
+
+
+def test_clihandler_bytes_aware():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        with open(name, 'wb') as fp:
+            fp.write(b'h1 GET /\nh2 POST /\nh3 POST /')
+        lines = []
+        s = Streamer(lines.append, bytes_aware(lambda line: line))
+        stats = CliHandler(s).handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 3
+        assert lines == [b'h1 GET /\n', b'h2 POST /\n', b'h3 POST /']
+
+        hosts = []
+        s = Streamer(hosts.append, host_of_post)
+        stats = CliHandler(s).handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SKIPPED] == 1
+        assert hosts == ['h2', 'h3']
+
+        # text is given unless the first procedure is marked
+        lines = []
+        s = Streamer(lines.append, lambda line: line)
+        CliHandler(s).handle([open(name)], 'utf-8')
+        assert lines == ['h1 GET /\n', 'h2 POST /\n', 'h3 POST /']
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+ERROR_LINE = re.compile(br'" 5\d\d ')
+
+
+@bytes_aware
+def server_error(line):
+    if ERROR_LINE.search(line):
+        return line
+
+
+def test_clihandler_mmap():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'access.log')
+        with open(name, 'wb') as fp:
+            fp.write(b'"GET /" 200 1\n"GET /a" 503 1\n"GET /b" 500 1')
+        lines = []
+        s = Streamer(lines.append, server_error)
+        stats = CliHandler(s, mmap=True).handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 2
+        if PY3:
+            assert all(isinstance(v, memoryview) for v in lines)
+        assert lines == [b'"GET /a" 503 1\n', b'"GET /b" 500 1']
+
+        # mapped lines are same as lines read as usual
+        plain = []
+        s = Streamer(plain.append, server_error)
+        CliHandler(s).handle([open(name)], 'utf-8')
+        assert [bytes(v) for v in lines] == plain
+
+        # text procedure gets decoded lines
+        lines = []
+        s = Streamer(lines.append, lambda line: line)
+        CliHandler(s, mmap=True).handle([open(name)], 'utf-8')
+        assert lines[0] == '"GET /" 200 1\n'
+
+        # pipe is read as usual
+        lines = []
+        s = Streamer(lines.append, lambda line: line)
+        sys.stdin = StringIO()
+        sys.stdin.write('A\n')
+        sys.stdin.seek(0)
+        CliHandler(s, mmap=True).handle(None, 'utf-8')
+        assert lines == ['A\n']
+    finally:
+        shutil.rmtree(tmpdir)
+
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
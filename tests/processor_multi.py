@@ -1,14 +1,27 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
 from multiprocessing import util
 
-from clitool.processor import Streamer
+from clitool.processor import (
+    CliHandler, RowMapper, SimpleDictReporter, Streamer, batched,
+    bytes_aware, split_ranges
+)
 from clitool import (
     PROCESSING_SUCCESS,
     PROCESSING_SKIPPED,
     PROCESSING_ERROR,
-    PROCESSING_TOTAL
+    PROCESSING_TOTAL,
+    PROCESSING_CHUNKSIZE,
+    PROCESSING_INFLIGHT,
+    PROCESSING_INFLIGHT_BYTES,
+    PROCESSING_PROCEDURES
 )
 
 
@@ -24,4 +37,460 @@ def test_streamer_linecount():
     assert stats[PROCESSING_ERROR] == 0
 
 
+def test_streamer_shared_pool():
+    s = Streamer(processes=2)
+    with s:
+        pool = s.pool
+        assert pool is not None
+        for n in (10, 20):
+            stats = s.consume(range(n))
+            assert stats[PROCESSING_TOTAL] == n
+            assert stats[PROCESSING_SUCCESS] == n - 1
+            assert s.pool is pool
+    assert s.pool is None
+
+
+def test_clihandler_shared_pool():
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as fp:
+        fp.write('a\nb\n')
+        fp.flush()
+        with Streamer(processes=2) as s:
+            pool = s.pool
+            handler = CliHandler(s)
+            for _ in range(2):
+                stats = handler.handle([open(fp.name)], 'utf-8')
+                assert stats[0][PROCESSING_SUCCESS] == 2
+                # pool opened by caller is not closed by handler
+                assert s.pool is pool
+        assert s.pool is None
+        # pool is opened and closed by handler
+        stats = handler.handle([open(fp.name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 2
+        assert s.pool is None
+
+
+def test_streamer_shared_pool_interrupted():
+
+    def interrupted():
+        yield 1
+        raise KeyboardInterrupt()
+
+    s = Streamer(processes=2)
+    try:
+        with s:
+            s.consume(interrupted())
+        assert False, "KeyboardInterrupt must be propagated"
+    except KeyboardInterrupt:
+        pass
+    assert s.pool is None
+
+
+def slow(n):
+    time.sleep(0.01)
+    return n
+
+
+def test_streamer_throttled_interrupted():
+
+    def interrupt(r):
+        raise KeyboardInterrupt()
+
+    def consume(s, interrupted):
+        try:
+            s.consume(range(1, 1001))
+        except KeyboardInterrupt:
+            interrupted.append(True)
+
+    for kwargs in ({'max_inflight': 4}, {'ordered': True, 'window': 10}):
+        for _ in range(3):
+            s = Streamer(interrupt, slow, processes=2, executor='thread',
+                    **kwargs)
+            interrupted = []
+            t = threading.Thread(target=consume, args=(s, interrupted))
+            t.daemon = True
+            t.start()
+            t.join(5)
+            assert not t.is_alive(), "interrupted pool must not hang"
+            assert interrupted == [True]
+
+
+def drop_odd(n):
+    if n % 2 == 0:
+        return n
+
+
+def fail_triple(n):
+    if n % 3 == 0:
+        return False
+    return n
+
+
+def test_streamer_fused():
+    serial = Streamer(None, drop_odd, fail_triple).consume(range(30))
+    for fused in (True, False):
+        results = []
+        s = Streamer(results.append, drop_odd, fail_triple,
+                processes=2, fused=fused)
+        stats = s.consume(range(30))
+        for k in (PROCESSING_TOTAL, PROCESSING_SUCCESS,
+                  PROCESSING_SKIPPED, PROCESSING_ERROR):
+            assert stats[k] == serial[k], k
+        assert sorted(results) == [2, 4, 8, 10, 14, 16, 20, 22, 26, 28]
+
+
+def test_streamer_auto_chunksize():
+    results = []
+    s = Streamer(results.append, drop_odd, processes=2)
+    stats = s.consume(range(10000), chunksize='auto')
+    assert stats[PROCESSING_TOTAL] == 10000
+    assert stats[PROCESSING_SUCCESS] == 4999
+    assert stats[PROCESSING_SKIPPED] == 5001
+    assert stats[PROCESSING_CHUNKSIZE] > 1
+    assert len(results) == 4999
+    s = Streamer(None, drop_odd, processes=2, fused=False)
+    try:
+        s.consume(range(10), chunksize='auto')
+    except ValueError:
+        pass
+    else:
+        assert False, 'unfused mode must be refused'
+
+    s = Streamer(results.append, drop_odd, processes=2, executor='thread')
+    stats = s.consume(range(10000), chunksize='auto')
+    assert stats[PROCESSING_SUCCESS] == 4999
+    assert stats[PROCESSING_CHUNKSIZE] > 1
+
+
+def slow_first(n):
+    if n == 1:
+        time.sleep(0.2)
+    return n
+
+
+def test_streamer_ordered():
+    for window in (None, 10):
+        results = []
+        s = Streamer(results.append, slow_first, processes=2,
+                ordered=True, window=window)
+        stats = s.consume(range(1, 101), chunksize=3)
+        assert stats[PROCESSING_SUCCESS] == 100
+        assert results == list(range(1, 101))
+
+
+def test_streamer_ordered_unfused():
+    results = []
+    s = Streamer(results.append, slow_first, processes=2,
+            ordered=True, fused=False)
+    s.consume(range(1, 101))
+    assert results == list(range(1, 101))
+
+
+@batched
+def drop_odd_batch(numbers):
+    return [n if n % 2 == 0 else None for n in numbers]
+
+
+def test_streamer_batched():
+    for fused in (True, False):
+        results = []
+        s = Streamer(results.append, drop_odd_batch, fail_triple,
+                processes=2, fused=fused, batchsize=7)
+        stats = s.consume(range(30))
+        assert stats[PROCESSING_TOTAL] == 30
+        assert stats[PROCESSING_SKIPPED] == 16
+        assert stats[PROCESSING_ERROR] == 4
+        assert sorted(results) == [2, 4, 8, 10, 14, 16, 20, 22, 26, 28]
+
+
+def test_streamer_unfused_batched():
+    sizes = []
+
+    @batched
+    def double(numbers):
+        sizes.append(len(numbers))
+        return [n * 2 for n in numbers]
+
+    results = []
+    s = Streamer(results.append, double, drop_odd, processes=2,
+            executor='thread', fused=False, ordered=True, batchsize=10)
+    stats = s.consume(range(1, 101))
+    assert stats[PROCESSING_SUCCESS] == 100
+    assert results == list(range(2, 201, 2))
+    # whole batch is given to batched procedure
+    assert sorted(sizes) == [10] * 10
+
+
+def test_streamer_max_inflight():
+    s = Streamer(None, slow_first, processes=2, max_inflight=10)
+    stats = s.consume(range(1, 101), chunksize=3)
+    assert stats[PROCESSING_SUCCESS] == 100
+    assert 0 < stats[PROCESSING_INFLIGHT] <= 10
+    # chunk size is clamped to the limit
+    stats = s.consume(range(1, 101), chunksize=30)
+    assert stats[PROCESSING_SUCCESS] == 100
+    assert 0 < stats[PROCESSING_INFLIGHT] <= 10
+
+    lines = ['%08d' % (i, ) for i in range(100)]
+    s = Streamer(None, len, processes=2, max_inflight_bytes=50)
+    stats = s.consume(lines, chunksize=100)
+    assert stats[PROCESSING_SUCCESS] == 100
+    assert 0 < stats[PROCESSING_INFLIGHT_BYTES] <= 56
+
+
+def test_streamer_instrument():
+    s = Streamer(None, drop_odd_batch, fail_triple, processes=2,
+            instrument=True, batchsize=7)
+    stats = s.consume(range(30))
+    procs = stats[PROCESSING_PROCEDURES]
+    assert procs[0]['name'] == 'drop_odd_batch'
+    assert procs[0]['calls'] == 5
+    assert procs[0]['items'] == 29
+    assert procs[0]['skipped'] == 15
+    assert procs[1]['calls'] == 14
+    assert procs[1]['error'] == 4
+    try:
+        Streamer(None, drop_odd, processes=2, instrument=True, fused=False)
+    except ValueError:
+        pass
+    else:
+        assert False, 'unfused mode must be refused'
+
+
+def parse_pair(line):
+    if not isinstance(line, str):
+        line = line.decode('utf-8')
+    k, v = line.strip().split(',')
+    return {k: v}
+
+
+class CallCountReporter(SimpleDictReporter):
+
+    calls = 0
+
+    def __call__(self, entry):
+        self.calls += 1
+        super(CallCountReporter, self).__call__(entry)
+
+
+def test_streamer_aggregate():
+    lines = ['key%d,%d' % (i % 2, i % 3) for i in range(300)]
+    for executor in ('process', 'thread'):
+        reporter = CallCountReporter()
+        s = Streamer(reporter, parse_pair, processes=2, executor=executor)
+        stats = s.consume(lines + [''], chunksize=7)
+        assert stats[PROCESSING_SUCCESS] == 300
+        assert stats[PROCESSING_SKIPPED] == 1
+        assert reporter.calls == 0
+        assert reporter.report()['key0:0'] == 50
+        assert sum(reporter.report().values()) == 300
+    reporter = CallCountReporter()
+    s = Streamer(reporter, parse_pair, processes=2, aggregate=False)
+    s.consume(lines, chunksize=7)
+    assert reporter.calls == 300
+    assert reporter.report()['key0:0'] == 50
+
+
+def test_clihandler_file_partition(caplog):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        names = []
+        for i in range(3):
+            name = os.path.join(tmpdir, 'input%d.txt' % (i, ))
+            with open(name, 'w') as fp:
+                for j in range(100 * (i + 1)):
+                    fp.write('key%d,%d\n' % (i, j % 3))
+            names.append(name)
+        with open(names[2], 'rb') as src:
+            with gzip.open(names[2] + '.gz', 'wb') as dst:
+                dst.write(src.read())
+        names[2] += '.gz'
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, parse_pair, processes=2)
+        handler = CliHandler(s, partition='file')
+        stats = handler.handle([open(n) for n in names], 'utf-8')
+        assert [st['source'] for st in stats] == names
+        assert [st[PROCESSING_SUCCESS] for st in stats] == [100, 200, 300]
+        report = reporter.report()
+        assert report['key0:0'] == 34
+        assert report['key2:2'] == 100
+
+        # results of whole file are not kept in worker
+        results = []
+        s = Streamer(results.append, parse_pair, processes=2)
+        handler = CliHandler(s, partition='file')
+        stats = handler.handle([open(n) for n in names], 'utf-8')
+        assert [st[PROCESSING_SUCCESS] for st in stats] == [100, 200, 300]
+        assert len(results) == 600
+        assert 'callback is not mergeable' in caplog.text
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def first_column(row):
+    return {row[0]: row[1]}
+
+
+def test_split_ranges_quoted():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'input.csv')
+        with open(name, 'w') as fp:
+            for i in range(100):
+                fp.write('k,"line%d\nnext"\n' % (i, ))
+        plain = split_ranges(name, 7)
+        ranges = split_ranges(name, 7, quoted=True)
+        assert len(ranges) > 1
+        for rs in (plain, ranges):
+            assert rs[0][0] == 0
+            assert rs[-1][1] == os.path.getsize(name)
+            assert all(a[1] == b[0] for a, b in zip(rs, rs[1:]))
+        with open(name, 'rb') as fp:
+            data = fp.read()
+        for start, _ in ranges:
+            assert data[start:start + 2] == b'k,'
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_clihandler_range_partition():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        names = [os.path.join(tmpdir, 'input.txt'),
+                 os.path.join(tmpdir, 'input.csv')]
+        with open(names[0], 'w') as fp:
+            for j in range(1000):
+                fp.write('key,%d\n' % (j % 4, ))
+        with open(names[1], 'w') as fp:
+            for j in range(300):
+                fp.write('k,"%d\nquoted"\n' % (j % 3, ))
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, parse_pair, processes=2)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(names[0])], 'utf-8')
+        assert stats[0]['source'] == names[0]
+        assert stats[0][PROCESSING_SUCCESS] == 1000
+        assert reporter.report()['key:3'] == 250
+
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, first_column, processes=2)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(names[1])], 'utf-8')
+        assert stats[0][PROCESSING_TOTAL] == 300
+        assert reporter.report()['k:2\nquoted'] == 100
+
+        names.append(os.path.join(tmpdir, 'header.csv'))
+        with open(names[2], 'w') as fp:
+            fp.write('"col\nor",size\n')
+            for j in range(2000):
+                fp.write('red,%d\n' % (j, ))
+        reporter = SimpleDictReporter(fields=('col\nor', ))
+        s = Streamer(reporter, RowMapper(), processes=2)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(names[2])], 'utf-8')
+        # header row goes to procedures of each range, but is counted once
+        assert stats[0][PROCESSING_TOTAL] == 2001
+        assert stats[0][PROCESSING_SUCCESS] == 2000
+        assert reporter.report() == {'col\nor:red': 2000}
+
+        try:
+            handler.handle([open(names[1])], 'utf-16')
+        except ValueError:
+            pass
+        else:
+            assert False, 'utf-16 must be refused'
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_clihandler_range_partition_instrument():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'input.txt')
+        with open(name, 'wb') as fp:
+            fp.write(''.join('key,%d\n' % (j % 4, )
+                             for j in range(1000)).encode('utf-8-sig'))
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, parse_pair, processes=2, instrument=True)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(name)], 'utf-8-sig')
+        assert stats[0][PROCESSING_SUCCESS] == 1000
+        assert reporter.report()['key:0'] == 250
+        # profiles of all ranges are merged
+        procs = stats[0][PROCESSING_PROCEDURES]
+        assert procs[0]['name'] == 'parse_pair'
+        assert procs[0]['calls'] == 1000
+        assert 0 < procs[0]['p50'] <= procs[0]['p99']
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_clihandler_range_partition_json_lines():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'input.jsonl')
+        with open(name, 'w') as fp:
+            for i in range(1000):
+                fp.write('{"key": "%d"}\n' % (i % 4, ))
+            fp.write('{broken\n')
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, processes=2)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 1000
+        assert stats[0][PROCESSING_SKIPPED] == 1
+        assert reporter.report()['key:3'] == 250
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@bytes_aware
+def first_field(line):
+    assert isinstance(line, bytes)
+    return {'key': line.split(b',', 1)[0].decode('ascii')}
+
+
+@bytes_aware
+def first_byte(line):
+    assert isinstance(line, memoryview)
+    return {'key': line[:1].tobytes().decode('ascii')}
+
+
+def test_clihandler_range_partition_bytes():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'input.txt')
+        with open(name, 'w') as fp:
+            for i in range(1000):
+                fp.write('%d,value\n' % (i % 4, ))
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, first_field, processes=2)
+        handler = CliHandler(s, partition='range')
+        handler.range_size = 100
+        stats = handler.handle([open(name)], 'utf-8')
+        assert stats[0][PROCESSING_SUCCESS] == 1000
+        assert reporter.report()['key:3'] == 250
+
+        # each worker maps the file and gives slices of it
+        for partition in ('range', 'file'):
+            reporter = SimpleDictReporter()
+            s = Streamer(reporter, first_byte, processes=2)
+            handler = CliHandler(s, partition=partition, mmap=True)
+            handler.range_size = 100
+            stats = handler.handle([open(name)], 'utf-8')
+            assert stats[0][PROCESSING_SUCCESS] == 1000
+            assert reporter.report()['key:3'] == 250
+
+        # lines are copied to be sent to process pool
+        reporter = SimpleDictReporter()
+        s = Streamer(reporter, first_field, processes=2)
+        stats = CliHandler(s, mmap=True).handle([open(name)], 'utf-8')
+        assert reporter.report()['key:3'] == 250
+    finally:
+        shutil.rmtree(tmpdir)
+
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
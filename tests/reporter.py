@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from clitool.processor import Streamer
+from clitool.reporter import HeavyHitterReporter, WindowReporter
+
+
+def parse(i):
+    return {'path': '/p%d' % (i % 7 if i % 2 else 0, ), 'user': 'u%d' % i,
+            'status': 200}
+
+
+def test_heavy_hitter_reporter():
+    reporter = HeavyHitterReporter(capacity=5, fields=('path', 'status'))
+    for i in range(1000):
+        reporter(parse(i))
+    reporter(None)
+    value, count, error = reporter.top('path', 1)[0]
+    assert value == '/p0'
+    assert count - error <= 571 <= count
+    assert reporter.distinct('path') == 7
+    assert reporter.distinct('user') == 0
+    assert reporter.top('status') == []
+    report = reporter.report()
+    assert report['path:/p0'] >= 571
+
+
+def test_heavy_hitter_reporter_parallel():
+    reporter = HeavyHitterReporter(capacity=20)
+    s = Streamer(reporter, parse, processes=2)
+    stats = s.consume(range(1, 2001), chunksize=50)
+    assert stats['success'] == 2000
+    value, count, error = reporter.top('path', 1)[0]
+    assert value == '/p0'
+    assert count - error <= 1143 <= count
+    assert abs(reporter.distinct('user') - 2000) < 2000 * 0.05
+    assert len(reporter.top('user')) == 20
+
+    restored = HeavyHitterReporter(capacity=20)
+    restored.restore(reporter.state())
+    assert restored.report() == reporter.report()
+
+
+def test_window_reporter_tumbling():
+    windows = []
+    reporter = WindowReporter(60, lateness=30, sink=windows.append)
+    base = datetime(2012, 10, 17, 19, 0)
+    for sec, status in ((0, 200), (59, 404), (61, 200), (50, 200),
+                        (130, 200), (20, 200), (125, 200)):
+        reporter({'time': base.replace(minute=sec // 60, second=sec % 60),
+                  'status': status, 'size': 100})
+    # Window of 19:00 is closed by 19:02:10, and record of 19:00:20 is late.
+    assert len(windows) == 1
+    assert windows[0] == {
+        'start': base, 'end': base.replace(minute=1), 'count': 3,
+        'status': {200: 2, 404: 1}, 'size': 300}
+    assert reporter.late == 1
+    assert len(reporter.windows) == 2
+    reporter.close()
+    assert [w['count'] for w in windows] == [3, 1, 2]
+    assert not reporter.windows
+
+
+def test_window_reporter_sliding():
+    reporter = WindowReporter(60, slide=30, sums=())
+    for t in range(0, 120, 10):
+        reporter({'time': t, 'status': 200})
+    windows = reporter.report()
+    assert [(w['start'], w['count']) for w in windows] == [
+        (-30, 3), (0, 6), (30, 6), (60, 6), (90, 3)]
+    assert 'size' not in windows[0]
+    state = reporter.state()
+    restored = WindowReporter(60, slide=30, sums=())
+    restored.restore(state)
+    restored({'time': 200, 'status': 200})
+    assert [w['start'] for w in restored.closed] == [60, 90]
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import six
+
+from clitool.processor import Streamer
+from clitool.sink import CsvSink, JsonLinesSink, LtsvSink, open_sink
+
+FIELDS = (
+    {'id': 'time', 'type': 'datetime', 'format': '%Y-%m-%d %H:%M'},
+    {'id': 'name', 'type': 'string'},
+    {'id': 'score', 'type': 'float', 'precision': 1},
+    {'id': 'kind', 'type': 'string', 'default': 'UNKNOWN'}
+)
+
+RECORDS = [
+    {'time': datetime(2012, 10, 17, 19, 9), 'name': six.u('a,\u3042'),
+     'score': 1.25},
+    {'time': datetime(2012, 10, 17, 19, 10), 'name': six.u('b\tc'),
+     'score': 2.0, 'kind': 'x'}
+]
+
+
+def test_csv_sink():
+    buf = io.BytesIO()
+    sink = CsvSink(buf, FIELDS, batch=2)
+    for r in RECORDS:
+        sink(r)
+    # header and first row are written on the batch
+    assert buf.getvalue().count(b'\n') == 2
+    sink(None)
+    sink.close()
+    assert buf.getvalue().decode('utf-8') == six.u(
+        'time,name,score,kind\n'
+        '2012-10-17 19:09,"a,\u3042",1.2,UNKNOWN\n'
+        '2012-10-17 19:10,b\tc,2.0,x\n')
+
+
+def test_text_output():
+    buf = io.BytesIO()
+    fp = io.TextIOWrapper(buf, 'ascii')
+    fp.write(six.u('#\n'))
+    with open_sink('tsv', fp, FIELDS[1:2], 'cp932') as sink:
+        sink(RECORDS[0])
+    assert buf.getvalue() == six.u('#\nname\na,\u3042\n').encode('cp932')
+    buf = io.StringIO()
+    with open_sink('tsv', buf) as sink:
+        for r in RECORDS:
+            sink(r)
+    assert buf.getvalue().splitlines()[0] == 'name\tscore\ttime'
+    assert buf.getvalue().splitlines()[2] == \
+        '"b\tc"\t2.0\t2012-10-17 19:10:00'
+    try:
+        open_sink('xml', buf)
+    except ValueError:
+        pass
+    else:
+        assert False, 'unknown format'
+
+
+def test_json_lines_and_ltsv_sink():
+    buf = io.BytesIO()
+    fields = FIELDS + ({'id': 'size', 'type': 'integer'},
+                       {'id': 'ok', 'type': 'boolean'},
+                       {'id': 'at', 'type': 'datetime'})
+    with JsonLinesSink(buf, fields) as sink:
+        for r in RECORDS:
+            sink(r)
+        sink({'size': 0, 'ok': False, 'score': 1.25, 'at': RECORDS[0]['time']})
+    lines = buf.getvalue().decode('utf-8').splitlines()
+    assert lines[0].startswith('{"time":"2012-10-17 19:09","name":')
+    assert json.loads(lines[1]) == {'time': '2012-10-17 19:10',
+                                    'name': 'b\tc', 'score': 2.0,
+                                    'kind': 'x', 'size': None, 'ok': None,
+                                    'at': None}
+    # types and falsy values are kept, default is given for missing
+    assert json.loads(lines[2]) == {'time': None, 'name': None,
+                                    'score': 1.25, 'kind': 'UNKNOWN',
+                                    'size': 0, 'ok': False,
+                                    'at': '2012-10-17T19:09:00'}
+    buf = io.BytesIO()
+    with LtsvSink(buf, FIELDS[1:]) as sink:
+        for r in RECORDS:
+            sink(r)
+    assert buf.getvalue().decode('utf-8') == six.u(
+        'name:a,\u3042\tscore:1.2\tkind:UNKNOWN\n'
+        'name:b\\tc\tscore:2.0\tkind:x\n')
+
+
+def test_sink_callback():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        name = os.path.join(tmpdir, 'out.csv')
+        fields = ({'id': 'n', 'type': 'integer'}, )
+        with open_sink('csv', name, fields, batch=100) as sink:
+            s = Streamer(sink, lambda line: {'n': len(line)})
+            s.consume(['a', 'bb'] * 150)
+            assert sink.count == 300
+        with open(name) as fp:
+            lines = fp.read().splitlines()
+        assert lines[:3] == ['n', '1', '2']
+        assert len(lines) == 301
+    finally:
+        shutil.rmtree(tmpdir)
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
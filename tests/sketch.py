@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+from clitool.sketch import HyperLogLog, SpaceSaving
+
+
+def _zipf_stream(n, seed=1):
+    rand = random.Random(seed)
+    return ['item%d' % (int(1 / (rand.random() + 1e-9)), ) for _ in range(n)]
+
+
+def test_space_saving_bound():
+    stream = _zipf_stream(20000)
+    exact = {}
+    for item in stream:
+        exact[item] = exact.get(item, 0) + 1
+    sketch = SpaceSaving(50)
+    for item in stream:
+        sketch.add(item)
+    assert len(sketch) <= 100
+    assert sketch.total == len(stream)
+    bound = len(stream) / 50.0
+    for item, count, error in sketch.top():
+        assert exact[item] <= count <= exact[item] + error
+        assert error <= bound
+    heavy = [k for k, v in exact.items() if v > bound]
+    top = set(item for item, _, _ in sketch.top())
+    assert set(heavy) <= top
+    assert sketch.top(1)[0][0] == 'item1'
+
+
+def test_space_saving_merge():
+    stream = _zipf_stream(20000)
+    exact = {}
+    for item in stream:
+        exact[item] = exact.get(item, 0) + 1
+    a, b = SpaceSaving(50), SpaceSaving(50)
+    for i, item in enumerate(stream):
+        (a if i % 2 else b).add(item)
+    a.merge(SpaceSaving.from_state(b.state(), 50))
+    assert len(a) <= 50
+    assert a.total == len(stream)
+    for item, count, error in a.top():
+        assert exact[item] <= count <= exact[item] + error
+
+
+def test_hyperloglog():
+    hll = HyperLogLog(12)
+    assert hll.count() == 0
+    for i in range(100):
+        hll.add('value%d' % (i % 10, ))
+    assert hll.count() == 10
+    for i in range(50000):
+        hll.add('value%d' % (i, ))
+    assert abs(hll.count() - 50000) < 50000 * 0.05
+
+
+def test_hyperloglog_merge():
+    a, b = HyperLogLog(10), HyperLogLog(10)
+    for i in range(20000):
+        (a if i % 2 else b).add(i)
+        b.add(i % 100)
+    a.merge(HyperLogLog.from_state(b.state()))
+    assert abs(a.count() - 20000) < 20000 * 0.1
+    try:
+        a.merge(HyperLogLog(12))
+    except ValueError:
+        pass
+    else:
+        assert False, 'precision must match'
+
+# vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :
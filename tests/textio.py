@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
 import datetime
-from clitool.textio import Sequential, RowMapper, DictMapper
+import io
+import json
+import os
+import tempfile
+
+import pytest
+import six
+from six import PY3, StringIO
+
+from clitool import textio
+from clitool.textio import (
+    Sequential, RowMapper, DictMapper, MappedLines, byte_lines, decode,
+    json_array, json_lines
+)
 
 FIELDS = (
     {'id': 'id', 'type': 'string'},
@@ -72,4 +85,120 @@ def test_sequential():
     assert 'kind' not in r, r['kind']
     assert r['update_type'] == 1
 
+
+def test_byte_lines():
+    data = b'a\nbb\r\ncc\rdd\n\n' + b'x' * 10 + b'\ntail'
+    expected = [b'a\n', b'bb\r\n', b'cc\rdd\n', b'\n', b'x' * 10 + b'\n',
+                b'tail']
+    with tempfile.NamedTemporaryFile() as fp:
+        fp.write(data)
+        fp.flush()
+        for bufsize in (1, 2, 3, 5, 1024):
+            with byte_lines(io.open(fp.name, 'rb', 0), bufsize) as lines:
+                assert list(lines) == expected
+    assert list(byte_lines(io.BytesIO(data))) == expected
+    assert list(byte_lines(io.BytesIO(b''))) == []
+
+
+def test_mapped_lines():
+    with tempfile.NamedTemporaryFile() as fp:
+        fp.write(b'a\nbb\n\xe3\x81\x82')
+        fp.flush()
+        lines = MappedLines(fp)
+        views = list(lines)
+        if PY3:
+            assert all(isinstance(v, memoryview) for v in views)
+        assert [bytes(v) for v in views] == [b'a\n', b'bb\n',
+                                             b'\xe3\x81\x82']
+        # slices are still valid after close
+        lines.close()
+        assert views[1] == b'bb\n'
+        lines = MappedLines(fp, 2, 5, view=False)
+        assert list(lines) == [b'bb\n']
+        lines.seek(0)
+        assert list(lines) == [b'a\n', b'bb\n']
+        lines = MappedLines(fp.fileno(), encoding='utf-8')
+        assert list(lines) == ['a\n', 'bb\n', six.u('\u3042')]
+    with tempfile.NamedTemporaryFile() as fp:
+        assert list(MappedLines(fp)) == []
+    r, w = os.pipe()
+    try:
+        with pytest.raises(ValueError):
+            MappedLines(r)
+    finally:
+        os.close(r)
+        os.close(w)
+
+
+def test_mapped_lines_plain_read(monkeypatch):
+    data = six.u('').join(six.u('%d,\u3042%s\n') % (i, 'x' * (i % 50))
+                          for i in range(1000)).encode('utf-8') + b'tail'
+    with tempfile.NamedTemporaryFile() as fp:
+        fp.write(data)
+        fp.flush()
+        expected = io.BytesIO(data).readlines()
+        for view in (True, False):
+            lines = MappedLines(fp, view=view)
+            assert [bytes(v) for v in lines] == expected
+            lines.close()
+        # ranges split at newlines give whole file
+        bound = data.index(b'\n', len(data) // 3) + 1
+        for view in (True, False):
+            lines = []
+            for start, end in ((0, bound), (bound, len(data))):
+                mapped = MappedLines(fp, start, end, view=view)
+                lines.extend(bytes(v) for v in mapped)
+                mapped.close()
+            assert lines == expected
+        lines = MappedLines(fp, encoding='utf-8')
+        assert list(lines) == io.StringIO(data.decode('utf-8')).readlines()
+        lines.close()
+
+        def unsupported(obj):
+            raise TypeError('cannot make memory view')
+
+        # mmap of Python 2 is sliced to bytes
+        monkeypatch.setattr(textio, 'memoryview', unsupported, raising=False)
+        lines = MappedLines(fp)
+        assert list(lines) == expected
+        lines.close()
+
+
+def test_decode():
+    assert decode(b'\xe3\x81\x82') == six.u('\u3042')
+    assert decode(memoryview(b'abc')[1:]) == 'bc'
+    assert decode(six.u('abc')) == 'abc'
+    assert decode(b'\x82\xa0', 'cp932') == six.u('\u3042')
+    assert decode(b'\xff', errors='replace') == six.u('\ufffd')
+
+
+def test_json_lines():
+    lines = ['{"a": 1}\n', '\n', '[1, 2]\n', '{"a": \n', b'"\xe3\x81\x82"\n']
+    assert list(json_lines(lines)) == [{'a': 1}, [1, 2], None,
+                                       six.u('\u3042')]
+
+
+def test_json_array():
+    data = [{'a': i, 'b': 'x' * (i % 7), 'c': [1.5, None, True]}
+            for i in range(200)] + [12345, -1.25e3, 'end']
+    text = json.dumps(data, indent=1)
+    for bufsize in (1, 7, 64, 100000):
+        assert list(json_array(StringIO(text), bufsize)) == data
+    assert list(json_array(StringIO('  [ ] '), 1)) == []
+    assert list(json_array(StringIO(''))) == []
+    assert list(json_array(StringIO('[1, 23]'), 5)) == [1, 23]
+
+
+def test_json_array_not_array():
+    assert list(json_array(StringIO('{"a": 1}'), 2)) == ['a']
+
+
+def test_json_array_invalid():
+    with pytest.raises(ValueError):
+        list(json_array(StringIO('[1, 2'), 2))
+    with pytest.raises(ValueError):
+        list(json_array(StringIO('[1 2]'), 2))
+    with pytest.raises(ValueError):
+        list(json_array(StringIO('[1, }]'), 2))
+
 # vim: set et ts=4 sw=4 cindent fileencoding=utf-8 :